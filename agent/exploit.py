@@ -1,5 +1,5 @@
 from mcp.exec_client import exec_command
-from mcp.browserbase_client import get_client, close_session
+from mcp.browserbase_client import get_client, close_session, acreate_session, ascreenshot
 import asyncio
 import os
 import json
@@ -250,14 +250,14 @@ async def create_dump_screenshot(dump_data: dict, target_url: str):
         # Create screenshot using browserbase
         session_id = None
         try:
-            # Create session with reuse enabled
-            session = bb_client.create_session(reuse=True)
+            # Create session with reuse enabled (off the event loop)
+            session = await acreate_session(reuse=True)
 
             if session and hasattr(session, 'id'):
                 session_id = session.id
 
                 # Capture screenshot
-                screenshot_url = bb_client.screenshot(session.id, f"file://{html_path}")
+                screenshot_url = await ascreenshot(session.id, f"file://{html_path}")
 
                 if screenshot_url:
                     logger.info(f"📸 Screenshot captured: {screenshot_url}")
@@ -4,7 +4,7 @@ import os
 from agent.recon import run_recon
 from agent.analyze import detect_vulns
 from agent.exploit import try_sqli
-from mcp.github_client import create_pr
+from mcp.github_client import acreate_pr
 from mcp.browserbase_client import create_session, screenshot
 
 async def autonomous_pentest():
@@ -201,7 +201,7 @@ Review the patches and evidence carefully.
                 pr_body += "🤖 **Generated 100% autonomously** by AutoCTF using E2B cloud sandboxes\n"
                 pr_body += "⚡ Powered by Claude AI + E2B + Model Context Protocol (MCP)\n"
 
-                pr_url = create_pr(
+                pr_url = await acreate_pr(
                     title=f"[AutoCTF] Security Fixes for {len(successful_exploits)} Vulnerabilities",
                     body=pr_body,
                     branch=f"autoctf-patch-{int(asyncio.get_event_loop().time())}",
@@ -1,12 +1,18 @@
-from mcp.exec_client import exec_command
-import asyncio
+from mcp.exec_client import exec_command, exec_many, run_cache
 import re
 
 async def run_recon(target_ip: str, target_url: str):
     """
     Run reconnaissance on target
     Handles both live web apps and GitHub repositories
+    DNS/whois lookups are shared within this run only
     """
+    with run_cache():
+        return await _run_recon(target_ip, target_url)
+
+
+async def _run_recon(target_ip: str, target_url: str):
+    """Reconnaissance for one pentest run (see run_recon)"""
 
     # Check if target is a GitHub repository
     if "github.com" in target_url:
@@ -29,18 +35,19 @@ async def run_recon(target_ip: str, target_url: str):
 
     # Run full recon if target is live
     print("🔍 Running full reconnaissance...")
-    tasks = []
+    commands = []
 
     # Only run nmap if we have a valid IP
     if target_ip and not target_ip.startswith("http"):
-        tasks.append(exec_command(f"nmap -Pn -T4 -p 80,443,8080,8443 {target_ip}", timeout=90))
+        commands.append(f"nmap -Pn -T4 -p 80,443,8080,8443 {target_ip}")
 
     # Web application scanning
-    tasks.append(exec_command(f"curl -I {target_url}", timeout=30))
-    tasks.append(exec_command(f"whatweb {target_url} || echo 'whatweb not available'", timeout=30))
+    commands.append(f"curl -I {target_url}")
+    commands.append(f"whatweb {target_url} || echo 'whatweb not available'")
 
     try:
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        # Independent scans run concurrently in the sandbox (timeout sized for nmap)
+        results = await exec_many(commands, timeout=90, on_chunk=_print_progress)
         # Filter out exceptions and join valid results
         valid_results = [r for r in results if isinstance(r, str)]
         return "\n\n".join(valid_results) if valid_results else "No reconnaissance data collected"
@@ -49,6 +56,14 @@ async def run_recon(target_ip: str, target_url: str):
         return f"Reconnaissance failed: {str(e)}"
 
 
+def _print_progress(command: str, chunk: str):
+    """Print scan output as it arrives, tagged with the tool it came from"""
+    tool = command.split()[0]
+    for line in chunk.splitlines():
+        if line.strip():
+            print(f"   [{tool}] {line.rstrip()}")
+
+
 async def run_github_recon(github_url: str):
     """Auto-deploy and analyze a GitHub repository"""
 
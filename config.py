@@ -0,0 +1,14 @@
+"""
+AutoCTF Configuration
+Loads .env once and exposes a read-only snapshot of the environment
+"""
+
+import os
+import types
+from dotenv import load_dotenv
+
+# Load environment variables (once per process, however many modules import this)
+load_dotenv()
+
+# Frozen view of the environment taken after .env is loaded - read settings with ENV.get(...)
+ENV = types.MappingProxyType(dict(os.environ))
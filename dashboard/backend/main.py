@@ -118,6 +118,10 @@ async def startup():
     else:
         print("⚠️  Startup validation skipped (module not available)")
 
+    # Warm the shared GitHub client (no longer validated at import time)
+    from mcp.github_client import GitHubClient
+    await asyncio.to_thread(GitHubClient.preflight)
+
     print("🌐 Dashboard API ready at http://localhost:8000")
     print("📊 API docs at http://localhost:8000/docs")
 
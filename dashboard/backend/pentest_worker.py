@@ -11,7 +11,7 @@ from agent.recon import run_recon
 from agent.analyze import detect_vulns
 from agent.exploit import try_sqli, create_dump_screenshot
 from mcp.browserbase_client import create_session, screenshot
-from mcp.github_client import create_pr
+from mcp.github_client import acreate_pr
 from sqlalchemy.orm import Session
 from models import PentestRun, Vulnerability, Patch, Target
 
@@ -245,7 +245,7 @@ This is not just a theoretical vulnerability - **we successfully exploited it an
 Review the exploitation evidence below to understand the severity.
 """
 
-                    pr_url = create_pr(
+                    pr_url = await acreate_pr(
                         title=f"🚨 [AutoCTF] CRITICAL: SQLi Patched for {target.name}",
                         body=pr_body,
                         branch=f"autoctf-patch-{run_id}",
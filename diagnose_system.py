@@ -7,7 +7,13 @@ Tests all subsystems with actual API calls and generates detailed report
 import os
 import sys
 import asyncio
+import contextvars
+import importlib
+import inspect
+import json
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -24,26 +30,44 @@ class Colors:
     BOLD = '\033[1m'
     END = '\033[0m'
 
+# Startup banner, built once at import
+BANNER = f"""
+{Colors.BOLD}{Colors.CYAN}╔════════════════════════════════════════════════════════════════════╗
+║                                                                    ║
+║              AutoCTF Full System Diagnostic v2.0                   ║
+║                                                                    ║
+║         Comprehensive testing of all subsystems and APIs           ║
+║                                                                    ║
+╚════════════════════════════════════════════════════════════════════╝{Colors.END}
+"""
+
 class DiagnosticReport:
     """Store and format diagnostic results"""
 
     def __init__(self):
         self.results = []
         self.start_time = time.time()
+        self._lock = threading.Lock()
 
     def add_result(self, subsystem, component, status, message, details=None):
-        """Add a test result"""
-        self.results.append({
+        """Add a test result (buffered with the current test's output, so the report keeps test order)"""
+        result = {
             'subsystem': subsystem,
             'component': component,
             'status': status,  # 'PASS', 'FAIL', 'WARN'
             'message': message,
             'details': details,
             'timestamp': time.time()
-        })
+        }
+        output = _output.get()
+        if output is not None:
+            output.results.append(result)
+            return
+        with self._lock:
+            self.results.append(result)
 
     def print_result(self, subsystem, component, status, message):
-        """Print a result line"""
+        """Buffer a result line in the current test's output"""
         if status == 'PASS':
             icon = f"{Colors.GREEN}✅{Colors.END}"
         elif status == 'FAIL':
@@ -51,7 +75,7 @@ class DiagnosticReport:
         else:  # WARN
             icon = f"{Colors.YELLOW}⚠️{Colors.END}"
 
-        print(f"  {icon} {component}: {message}")
+        _emit(f"  {icon} {component}: {message}")
 
     def generate_report(self):
         """Generate final report"""
@@ -59,17 +83,15 @@ class DiagnosticReport:
 
         # Count results
         total = len(self.results)
-        passed = len([r for r in self.results if r['status'] == 'PASS'])
-        failed = len([r for r in self.results if r['status'] == 'FAIL'])
-        warned = len([r for r in self.results if r['status'] == 'WARN'])
+        passed = sum(1 for r in self.results if r['status'] == 'PASS')
+        failed = sum(1 for r in self.results if r['status'] == 'FAIL')
+        warned = sum(1 for r in self.results if r['status'] == 'WARN')
 
         # Group by subsystem
         subsystems = {}
         for result in self.results:
-            subsystem = result['subsystem']
-            if subsystem not in subsystems:
-                subsystems[subsystem] = {'pass': 0, 'fail': 0, 'warn': 0}
-            subsystems[subsystem][result['status'].lower()] += 1
+            counts = subsystems.setdefault(result['subsystem'], {'pass': 0, 'fail': 0, 'warn': 0})
+            counts[result['status'].lower()] += 1
 
         print("\n" + "=" * 70)
         print(f"{Colors.BOLD}📊 DIAGNOSTIC REPORT{Colors.END}")
@@ -118,11 +140,76 @@ class DiagnosticReport:
 # Initialize report
 report = DiagnosticReport()
 
+def _import_module(name):
+    """Import a module, reusing it from sys.modules on repeat runs"""
+    if name in sys.modules:
+        return sys.modules[name]
+    return importlib.import_module(name)
+
+# Shared pool for the sync tests (imports, filesystem, blocking SDK calls) so they overlap
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='diag-')
+
+class _TestOutput:
+    """Output lines and results of one test"""
+
+    def __init__(self):
+        self.lines = []
+        self.results = []
+
+# Output of the test running in the current thread/task; main() merges them in test order.
+# None outside the test runners, where lines are printed and results recorded directly.
+_output = contextvars.ContextVar('diag_output', default=None)
+
+def _emit(line=""):
+    """Buffer a line of the current test's output (or print it, outside a test runner)"""
+    output = _output.get()
+    if output is None:
+        print(line)
+    else:
+        output.lines.append(line)
+
+def _record_crash(fn, e):
+    """Report a test that raised instead of recording its own result"""
+    report.add_result('Diagnostic', fn.__name__, 'FAIL', 'Test crashed', f"{type(e).__name__}: {e}")
+    report.print_result('Diagnostic', fn.__name__, 'FAIL', f'Crashed: {e}')
+
+def _run_sync_test(fn):
+    """Run a sync test on a worker thread; returns its buffered output"""
+    output = _TestOutput()
+    token = _output.set(output)
+    try:
+        fn()
+    except Exception as e:
+        _record_crash(fn, e)
+    finally:
+        _output.reset(token)  # worker threads are reused by the next test
+    return output
+
+async def _run_async_test(fn):
+    """Run an async test in its own task (and context); returns its buffered output"""
+    output = _TestOutput()
+    _output.set(output)
+    try:
+        await fn()
+    except Exception as e:
+        _record_crash(fn, e)
+    return output
+
+def _dumps(obj):
+    """Compact JSON request body (the fallback when orjson isn't installed)"""
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+def _add_dashboard_path():
+    """Put dashboard/backend on sys.path for test_dashboard_imports (before any worker runs)"""
+    dashboard_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dashboard', 'backend')
+    if os.path.exists(dashboard_path) and dashboard_path not in sys.path:
+        sys.path.insert(0, dashboard_path)
+
 def test_env_vars():
     """Test 1: Environment Variables"""
     subsystem = "Environment Variables"
-    print(f"\n{Colors.BOLD}{Colors.BLUE}[1] {subsystem}{Colors.END}")
-    print("-" * 70)
+    _emit(f"\n{Colors.BOLD}{Colors.BLUE}[1] {subsystem}{Colors.END}")
+    _emit("-" * 70)
 
     required_vars = {
         'E2B_API_KEY': 'E2B Sandbox',
@@ -148,8 +235,8 @@ def test_env_vars():
 def test_mcp_imports():
     """Test 2: MCP Client Imports"""
     subsystem = "MCP Client Modules"
-    print(f"\n{Colors.BOLD}{Colors.BLUE}[2] {subsystem}{Colors.END}")
-    print("-" * 70)
+    _emit(f"\n{Colors.BOLD}{Colors.BLUE}[2] {subsystem}{Colors.END}")
+    _emit("-" * 70)
 
     modules = {
         'mcp.exec_client': 'E2B Exec Client',
@@ -159,7 +246,7 @@ def test_mcp_imports():
 
     for module, description in modules.items():
         try:
-            __import__(module)
+            _import_module(module)
             report.add_result(subsystem, description, 'PASS', 'Import successful')
             report.print_result(subsystem, description, 'PASS', 'Import successful')
         except Exception as e:
@@ -169,8 +256,8 @@ def test_mcp_imports():
 def test_agent_nodes():
     """Test 3: Agent Pipeline Nodes"""
     subsystem = "Agent Pipeline Nodes"
-    print(f"\n{Colors.BOLD}{Colors.BLUE}[3] {subsystem}{Colors.END}")
-    print("-" * 70)
+    _emit(f"\n{Colors.BOLD}{Colors.BLUE}[3] {subsystem}{Colors.END}")
+    _emit("-" * 70)
 
     nodes = {
         'agent.recon': 'Reconnaissance Node',
@@ -180,7 +267,7 @@ def test_agent_nodes():
 
     for module, description in nodes.items():
         try:
-            mod = __import__(module, fromlist=[''])
+            mod = _import_module(module)
 
             # Check for expected functions
             if module == 'agent.recon' and hasattr(mod, 'run_recon'):
@@ -199,22 +286,35 @@ def test_agent_nodes():
             report.add_result(subsystem, description, 'FAIL', 'Node unreachable', str(e))
             report.print_result(subsystem, description, 'FAIL', f'Unreachable: {e}')
 
+# Upper bound on sandbox creation during diagnostics (seconds)
+E2B_CREATE_TIMEOUT = 10
+
 async def test_e2b_connection():
     """Test 4: E2B Sandbox Connection"""
     subsystem = "E2B Sandbox"
-    print(f"\n{Colors.BOLD}{Colors.BLUE}[4] {subsystem}{Colors.END}")
-    print("-" * 70)
+    _emit(f"\n{Colors.BOLD}{Colors.BLUE}[4] {subsystem}{Colors.END}")
+    _emit("-" * 70)
+
+    # Fail fast before importing the SDK or opening sockets
+    if not os.getenv('E2B_API_KEY'):
+        report.add_result(subsystem, 'Configuration', 'FAIL', 'E2B_API_KEY not set')
+        report.print_result(subsystem, 'Configuration', 'FAIL', 'Missing API key')
+        return
 
+    sandbox = None
     try:
         from e2b import AsyncSandbox
 
-        print(f"  {Colors.CYAN}→ Creating sandbox...{Colors.END}")
-        sandbox = await AsyncSandbox.create(timeout=30)
+        _emit(f"  {Colors.CYAN}→ Creating sandbox...{Colors.END}")
+        sandbox = await asyncio.wait_for(
+            AsyncSandbox.create(timeout=30),
+            timeout=E2B_CREATE_TIMEOUT
+        )
         report.add_result(subsystem, 'Sandbox Creation', 'PASS', 'Sandbox created successfully')
         report.print_result(subsystem, 'Sandbox Creation', 'PASS', 'Created successfully')
 
         # Test command execution
-        print(f"  {Colors.CYAN}→ Testing command execution...{Colors.END}")
+        _emit(f"  {Colors.CYAN}→ Testing command execution...{Colors.END}")
         result = await sandbox.commands.run("echo 'AutoCTF Test'")
         if "AutoCTF Test" in result.stdout:
             report.add_result(subsystem, 'Command Execution', 'PASS', 'Commands execute correctly')
@@ -224,7 +324,7 @@ async def test_e2b_connection():
             report.print_result(subsystem, 'Command Execution', 'FAIL', 'Output incorrect')
 
         # Test tool availability (quick check)
-        print(f"  {Colors.CYAN}→ Checking security tools...{Colors.END}")
+        _emit(f"  {Colors.CYAN}→ Checking security tools...{Colors.END}")
         tool_check = await sandbox.commands.run("command -v nmap curl || echo 'tools_missing'")
         if "nmap" in tool_check.stdout and tool_check.exit_code == 0:
             report.add_result(subsystem, 'Security Tools', 'PASS', 'Tools pre-installed')
@@ -236,37 +336,49 @@ async def test_e2b_connection():
             report.add_result(subsystem, 'Security Tools', 'PASS', 'Tools available')
             report.print_result(subsystem, 'Security Tools', 'PASS', 'Available')
 
+    except asyncio.TimeoutError:
+        report.add_result(subsystem, 'E2B Connection', 'FAIL', 'Connection timed out',
+                        f'Sandbox not ready within {E2B_CREATE_TIMEOUT}s')
+        report.print_result(subsystem, 'E2B Connection', 'FAIL', f'Timed out after {E2B_CREATE_TIMEOUT}s')
     except Exception as e:
         report.add_result(subsystem, 'E2B Connection', 'FAIL', 'Connection failed', str(e))
         report.print_result(subsystem, 'E2B Connection', 'FAIL', f'Failed: {e}')
+    finally:
+        # Always release the sandbox, even on Ctrl-C, so it doesn't burn E2B quota
+        if sandbox is not None:
+            try:
+                await sandbox.kill()
+            except Exception:
+                pass
 
-async def test_github_auth():
+def test_github_auth():
     """Test 5: GitHub API Authentication"""
     subsystem = "GitHub API"
-    print(f"\n{Colors.BOLD}{Colors.BLUE}[5] {subsystem}{Colors.END}")
-    print("-" * 70)
+    _emit(f"\n{Colors.BOLD}{Colors.BLUE}[5] {subsystem}{Colors.END}")
+    _emit("-" * 70)
+
+    # Fail fast before importing the SDK or opening sockets
+    token = os.getenv('GITHUB_TOKEN')
+    repo_name = os.getenv('GITHUB_REPO')
+
+    if not token or not repo_name:
+        report.add_result(subsystem, 'Configuration', 'FAIL', 'GITHUB_TOKEN or GITHUB_REPO not set')
+        report.print_result(subsystem, 'Configuration', 'FAIL', 'Missing env vars')
+        return
+
+    # Check if token looks like a placeholder
+    if token.count('x') > 20 or token == 'ghp_xxxxxxxxxxxxxxxxxxxxxxxxxxxx':
+        report.add_result(subsystem, 'Configuration', 'FAIL',
+                        'GITHUB_TOKEN appears to be a placeholder',
+                        'Replace with real token from https://github.com/settings/tokens')
+        report.print_result(subsystem, 'Configuration', 'FAIL', 'Token is placeholder')
+        return
 
     try:
         from github import Github
         import github
 
-        token = os.getenv('GITHUB_TOKEN')
-        repo_name = os.getenv('GITHUB_REPO')
-
-        if not token or not repo_name:
-            report.add_result(subsystem, 'Configuration', 'FAIL', 'GITHUB_TOKEN or GITHUB_REPO not set')
-            report.print_result(subsystem, 'Configuration', 'FAIL', 'Missing env vars')
-            return
-
-        # Check if token looks like a placeholder
-        if token.count('x') > 20 or token == 'ghp_xxxxxxxxxxxxxxxxxxxxxxxxxxxx':
-            report.add_result(subsystem, 'Configuration', 'FAIL',
-                            'GITHUB_TOKEN appears to be a placeholder',
-                            'Replace with real token from https://github.com/settings/tokens')
-            report.print_result(subsystem, 'Configuration', 'FAIL', 'Token is placeholder')
-            return
-
-        print(f"  {Colors.CYAN}→ Authenticating...{Colors.END}")
+        _emit(f"  {Colors.CYAN}→ Authenticating...{Colors.END}")
         # Use new Auth API to avoid deprecation warning
         auth = github.Auth.Token(token)
         g = Github(auth=auth)
@@ -278,7 +390,7 @@ async def test_github_auth():
         report.print_result(subsystem, 'Authentication', 'PASS', f'Logged in as {username}')
 
         # Test repository access
-        print(f"  {Colors.CYAN}→ Testing repo access...{Colors.END}")
+        _emit(f"  {Colors.CYAN}→ Testing repo access...{Colors.END}")
         repo = g.get_repo(repo_name)
         report.add_result(subsystem, 'Repository Access', 'PASS', f'Can access {repo.name}')
         report.print_result(subsystem, 'Repository Access', 'PASS', f'Repo: {repo.name}')
@@ -300,24 +412,25 @@ async def test_github_auth():
         report.add_result(subsystem, 'GitHub API', 'FAIL', 'API test failed', str(e))
         report.print_result(subsystem, 'GitHub API', 'FAIL', f'Failed: {e}')
 
-async def test_browserbase():
+def test_browserbase():
     """Test 6: Browserbase Session"""
     subsystem = "Browserbase"
-    print(f"\n{Colors.BOLD}{Colors.BLUE}[6] {subsystem}{Colors.END}")
-    print("-" * 70)
+    _emit(f"\n{Colors.BOLD}{Colors.BLUE}[6] {subsystem}{Colors.END}")
+    _emit("-" * 70)
 
-    try:
-        from browserbase import Browserbase
+    # Fail fast before importing the SDK or opening sockets
+    api_key = os.getenv('BROWSERBASE_API_KEY')
+    project_id = os.getenv('BROWSERBASE_PROJECT_ID')
 
-        api_key = os.getenv('BROWSERBASE_API_KEY')
-        project_id = os.getenv('BROWSERBASE_PROJECT_ID')
+    if not api_key or not project_id:
+        report.add_result(subsystem, 'Configuration', 'FAIL', 'API key or project ID not set')
+        report.print_result(subsystem, 'Configuration', 'FAIL', 'Missing env vars')
+        return
 
-        if not api_key or not project_id:
-            report.add_result(subsystem, 'Configuration', 'FAIL', 'API key or project ID not set')
-            report.print_result(subsystem, 'Configuration', 'FAIL', 'Missing env vars')
-            return
+    try:
+        from browserbase import Browserbase
 
-        print(f"  {Colors.CYAN}→ Creating session...{Colors.END}")
+        _emit(f"  {Colors.CYAN}→ Creating session...{Colors.END}")
         bb = Browserbase(api_key=api_key)
         session = bb.sessions.create(project_id=project_id)
 
@@ -340,23 +453,29 @@ async def test_browserbase():
             report.add_result(subsystem, 'Browserbase API', 'FAIL', 'API test failed', error_msg)
             report.print_result(subsystem, 'Browserbase API', 'FAIL', f'Failed: {error_msg[:50]}')
 
-async def test_xai_api():
+def test_xai_api():
     """Test 7: xAI Grok API"""
     subsystem = "xAI Grok LLM"
-    print(f"\n{Colors.BOLD}{Colors.BLUE}[7] {subsystem}{Colors.END}")
-    print("-" * 70)
+    _emit(f"\n{Colors.BOLD}{Colors.BLUE}[7] {subsystem}{Colors.END}")
+    _emit("-" * 70)
 
-    try:
-        import requests
+    # Fail fast before importing the SDK or opening sockets
+    api_key = os.getenv('XAI_API_KEY')
 
-        api_key = os.getenv('XAI_API_KEY')
+    if not api_key:
+        report.add_result(subsystem, 'Configuration', 'FAIL', 'XAI_API_KEY not set')
+        report.print_result(subsystem, 'Configuration', 'FAIL', 'Missing API key')
+        return
 
-        if not api_key:
-            report.add_result(subsystem, 'Configuration', 'FAIL', 'XAI_API_KEY not set')
-            report.print_result(subsystem, 'Configuration', 'FAIL', 'Missing API key')
-            return
+    try:
+        import requests
+        try:
+            import orjson
+            dumps = orjson.dumps
+        except ImportError:
+            dumps = _dumps
 
-        print(f"  {Colors.CYAN}→ Testing API connection...{Colors.END}")
+        _emit(f"  {Colors.CYAN}→ Testing API connection...{Colors.END}")
 
         payload = {
             "model": "grok-2-1212",
@@ -372,7 +491,7 @@ async def test_xai_api():
         response = requests.post(
             "https://api.x.ai/v1/chat/completions",
             headers=headers,
-            json=payload,
+            data=dumps(payload),
             timeout=30
         )
 
@@ -401,8 +520,8 @@ async def test_xai_api():
 def test_repo_paths():
     """Test 8: Repository Cloning Paths"""
     subsystem = "Repository Paths"
-    print(f"\n{Colors.BOLD}{Colors.BLUE}[8] {subsystem}{Colors.END}")
-    print("-" * 70)
+    _emit(f"\n{Colors.BOLD}{Colors.BLUE}[8] {subsystem}{Colors.END}")
+    _emit("-" * 70)
 
     paths = {
         '/tmp': 'Temp directory for cloning',
@@ -431,14 +550,10 @@ def test_repo_paths():
 def test_dashboard_imports():
     """Test 9: Dashboard Backend"""
     subsystem = "Dashboard Backend"
-    print(f"\n{Colors.BOLD}{Colors.BLUE}[9] {subsystem}{Colors.END}")
-    print("-" * 70)
-
-    # Add dashboard paths to Python path
-    dashboard_path = os.path.join(os.path.dirname(__file__), 'dashboard', 'backend')
-    if os.path.exists(dashboard_path):
-        sys.path.insert(0, dashboard_path)
+    _emit(f"\n{Colors.BOLD}{Colors.BLUE}[9] {subsystem}{Colors.END}")
+    _emit("-" * 70)
 
+    # dashboard/backend is put on sys.path by main() before the tests start
     modules = {
         'models': 'Database Models',
         'schemas': 'Pydantic Schemas',
@@ -447,7 +562,7 @@ def test_dashboard_imports():
 
     for module, description in modules.items():
         try:
-            __import__(module)
+            _import_module(module)
             report.add_result(subsystem, description, 'PASS', 'Module importable')
             report.print_result(subsystem, description, 'PASS', 'Importable')
         except Exception as e:
@@ -456,29 +571,26 @@ def test_dashboard_imports():
 
 async def main():
     """Run all diagnostics"""
-    print(f"""
-{Colors.BOLD}{Colors.CYAN}╔════════════════════════════════════════════════════════════════════╗
-║                                                                    ║
-║              AutoCTF Full System Diagnostic v2.0                   ║
-║                                                                    ║
-║         Comprehensive testing of all subsystems and APIs           ║
-║                                                                    ║
-╚════════════════════════════════════════════════════════════════════╝{Colors.END}
-""")
+    print(BANNER)
 
     print(f"{Colors.BOLD}Starting diagnostic scan...{Colors.END}")
     print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
-    # Run all tests
-    test_env_vars()
-    test_mcp_imports()
-    test_agent_nodes()
-    await test_e2b_connection()
-    await test_github_auth()
-    await test_browserbase()
-    await test_xai_api()
-    test_repo_paths()
-    test_dashboard_imports()
+    _add_dashboard_path()
+
+    # Run all tests concurrently (sync ones on the executor, so blocking SDK calls stay
+    # off the loop), then print each test's buffered output and merge its results in test order
+    loop = asyncio.get_running_loop()
+    pending = [
+        asyncio.create_task(_run_async_test(fn)) if inspect.iscoroutinefunction(fn)
+        else loop.run_in_executor(_executor, _run_sync_test, fn)
+        for fn in (test_env_vars, test_mcp_imports, test_agent_nodes, test_e2b_connection,
+                   test_github_auth, test_browserbase, test_xai_api,
+                   test_repo_paths, test_dashboard_imports)
+    ]
+    for output in await asyncio.gather(*pending):
+        print("\n".join(output.lines))
+        report.results.extend(output.results)
 
     # Generate final report
     exit_code = report.generate_report()
@@ -0,0 +1,49 @@
+"""
+Event loop runner shared by the sync entry points
+Runs a coroutine on a fresh uvloop loop when uvloop is installed, without touching the
+global event loop policy (the dashboard process keeps whatever loop it configured)
+"""
+
+import asyncio
+import sys
+
+
+def _loop_factory():
+    """uvloop's event loop factory when installed, else None (the default loop)"""
+    try:
+        import uvloop
+        return uvloop.new_event_loop
+    except ImportError:
+        return None
+
+
+def _cancel_all_tasks(loop: asyncio.AbstractEventLoop):
+    """Cancel the tasks still pending on a finished loop and wait for them (as asyncio.run does)"""
+    pending = asyncio.all_tasks(loop)
+    if not pending:
+        return
+    for task in pending:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+
+
+def run_coroutine(coro):
+    """Run a coroutine to completion on a new event loop (uvloop when installed)"""
+    loop_factory = _loop_factory()
+    if sys.version_info >= (3, 11):
+        with asyncio.Runner(loop_factory=loop_factory) as runner:
+            return runner.run(coro)
+    if loop_factory is None:
+        return asyncio.run(coro)
+
+    # asyncio.Runner is 3.11+: drive the uvloop loop by hand rather than installing its policy
+    loop = loop_factory()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        try:
+            _cancel_all_tasks(loop)
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.run_until_complete(loop.shutdown_default_executor())
+        finally:
+            loop.close()
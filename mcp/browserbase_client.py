@@ -3,12 +3,25 @@ Browserbase Client with Session Management and Retry Logic
 Handles rate limiting gracefully with proper cleanup
 """
 
-from browserbase import Browserbase
+import asyncio
+import contextvars
+import functools
+import json
 import os
+import random
+import re
+import threading
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from dotenv import load_dotenv
-from typing import Optional
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows - cache still works, just without cross-process locking
+    fcntl = None
 
 # Load environment variables
 load_dotenv()
@@ -17,11 +30,263 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global session management
-_active_session = None
-_session_creation_time = None
+# Session shared by every thread and async task of this process: (session, created_at) or None.
+# Always replaced as a whole tuple, so the reuse fast path reads it without a lock
+_active: Optional[tuple] = None
+_create_lock = threading.Lock()  # guards reads/swaps of _active and _creating; never held across I/O
+
+# Set once the session create (or revive) in flight finishes; other callers wait on it instead of creating too
+_creating: Optional[threading.Event] = None
+
+# IDs of sessions this process created and hasn't closed (cleanup() closes all but the cached one)
+_created_ids: set = set()
+
 SESSION_TIMEOUT = 300  # 5 minutes - reuse session within this window
 
+# SDK methods that end a session, in order of preference, with their log label
+_CLOSE_METHODS = (('complete', 'completed'), ('stop', 'stopped'), ('delete', 'deleted'))
+_SCREENSHOT_URL_TMPL = "https://www.browserbase.com/sessions/{}".format
+
+# On-disk record of the reusable session, shared across CLI invocations
+_CACHE_PATH = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'autoctf' / 'bb_session.json'
+
+
+class _TokenBucket:
+    """Client-side token bucket so bursts are throttled locally instead of by a server 429"""
+
+    def __init__(self, capacity: int, refill_per_sec: float):
+        self.capacity = capacity
+        self.refill_per_sec = refill_per_sec
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_per_sec)
+        self._updated = now
+
+    def acquire(self, block: bool = True) -> bool:
+        """Take one token, waiting for a refill if block is True"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.refill_per_sec
+            if not block:
+                return False
+            time.sleep(wait)
+
+
+class _Breaker:
+    """Circuit breaker: after `threshold` consecutive 429s, skip creates for `cooldown` seconds"""
+
+    def __init__(self, threshold: int = 5, cooldown: float = 60):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._fails = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        return time.time() - self._opened_at < self.cooldown
+
+    def record_success(self):
+        with self._lock:
+            self._fails = 0
+
+    def record_rate_limit(self) -> bool:
+        """Count a 429; returns True if it opened the circuit"""
+        with self._lock:
+            self._fails += 1
+            if self._fails < self.threshold:
+                return False
+            self._fails = 0
+            self._opened_at = time.time()
+            return True
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Browserbase while the circuit is open (classified as a rate limit)"""
+    status_code = 429
+
+
+class _ProjectLimits:
+    """Client-side limiters and circuit breaker for one Browserbase project's session API"""
+
+    def __init__(self):
+        self.session = _TokenBucket(capacity=5, refill_per_sec=0.5)
+        self.close = _TokenBucket(capacity=4, refill_per_sec=2)
+        self.breaker = _Breaker()
+
+
+# project_id -> its limits, shared by every client and thread of this process
+_limits: Dict[str, _ProjectLimits] = {}
+_limits_lock = threading.Lock()
+
+
+def _limits_for(project_id: str) -> _ProjectLimits:
+    """Get or create the limits for a Browserbase project"""
+    with _limits_lock:
+        limits = _limits.get(project_id)
+        if limits is None:
+            limits = _limits[project_id] = _ProjectLimits()
+        return limits
+
+
+class _CacheLock:
+    """Exclusive advisory lock on the session cache file (no-op without fcntl)"""
+
+    def __enter__(self):
+        _CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(f"{_CACHE_PATH}.lock", 'w')
+        if fcntl:
+            fcntl.flock(self._fh, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self._fh, fcntl.LOCK_UN)
+        self._fh.close()
+
+
+def _read_session_cache() -> Optional[dict]:
+    """Return the cached {id, ts} record if it is still within SESSION_TIMEOUT"""
+    try:
+        data = json.loads(_CACHE_PATH.read_text())
+        if time.time() - float(data['ts']) < SESSION_TIMEOUT:
+            return data
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def _write_session_cache(session_id: Optional[str], created_at: float = 0.0):
+    """Atomically write (or clear, when session_id is None) the cached session record"""
+    try:
+        if session_id is None:
+            _CACHE_PATH.unlink(missing_ok=True)
+            return
+        _CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = _CACHE_PATH.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps({'id': session_id, 'ts': created_at}))
+        os.replace(tmp_path, _CACHE_PATH)
+    except OSError as e:
+        logger.debug(f"Could not update session cache: {e}")
+
+
+def _compute_backoff(attempt: int, base: float = 1.0, cap: float = 30.0, jitter: float = 0.5) -> float:
+    """Exponential backoff delay for a retry attempt, capped and with random jitter"""
+    return min(cap, base * (2 ** attempt)) * (1 + random.random() * jitter)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Extract a Retry-After delay (seconds) from an SDK error, if the server sent one"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after') or headers.get('Retry-After')
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+# HTTP statuses that change retry behavior, when only the error message carries them
+_STATUS_RE = re.compile(r'\b(401|403|404|429)\b')
+
+# Reason phrases standing in for those statuses in messages that carry no code
+_STATUS_TEXT_RE = re.compile(r'too many requests|unauthorized|forbidden|not found', re.IGNORECASE)
+_STATUS_TEXTS = {'too many requests': 429, 'unauthorized': 401, 'forbidden': 403, 'not found': 404}
+
+# Status code -> error kind; anything else is treated as transient
+_STATUS_KINDS = {429: "rate_limit", 401: "auth", 403: "auth", 404: "not_found"}
+
+
+def _status_of(error: Exception, message: str) -> Optional[int]:
+    """HTTP status of an SDK error, read structurally first, then from the message's code or reason phrase"""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if isinstance(status, int):
+        return status
+    match = _STATUS_RE.search(message)
+    if match:
+        return int(match.group(1))
+    match = _STATUS_TEXT_RE.search(message)
+    return _STATUS_TEXTS[match.group(0).lower()] if match else None
+
+
+def _classify(error: Exception, message: str) -> str:
+    """
+    Classify a Browserbase error
+
+    Returns:
+        'rate_limit', 'auth' or 'not_found' for HTTP 429/401-403/404,
+        otherwise 'transient'
+    """
+    return _STATUS_KINDS.get(_status_of(error, message), "transient")
+
+
+def classify_error(error: Exception) -> str:
+    """
+    Classify a Browserbase SDK error (see _classify)
+
+    Returns:
+        'rate_limit', 'auth', 'not_found' or 'transient'
+    """
+    return _classify(error, str(error))
+
+
+def keep_alive_session(bb, project_id: str) -> tuple:
+    """
+    Get a live session, preferring the one recorded in the session cache
+
+    A new session is created with keep_alive and recorded in the cache, so the
+    first screenshot (in this or a later process) reuses it instead of creating one.
+    The create goes through the project's limiter and circuit breaker, like create_session.
+
+    Args:
+        bb: Browserbase SDK client
+        project_id: Browserbase project for a new session
+
+    Returns:
+        (session, reused)
+
+    Raises:
+        CircuitOpenError: Browserbase kept rate limiting this project (see _Breaker)
+    """
+    limits = _limits_for(project_id)
+    with _CacheLock():
+        cached = _read_session_cache()
+        if cached:
+            try:
+                session = bb.sessions.retrieve(cached['id'])
+                if session and getattr(session, 'status', 'RUNNING') == 'RUNNING':
+                    return session, True
+            except Exception:
+                pass  # expired or released - create a fresh one
+
+        if limits.breaker.is_open():
+            raise CircuitOpenError("Browserbase circuit open after repeated 429s")
+        limits.session.acquire()
+        try:
+            # Browserbase ends the session when the cache record expires
+            session = bb.sessions.create(project_id=project_id, keep_alive=True, timeout=SESSION_TIMEOUT)
+        except Exception as e:
+            if classify_error(e) == "rate_limit":
+                limits.breaker.record_rate_limit()
+            raise
+        limits.breaker.record_success()
+        if session and hasattr(session, 'id'):
+            _created_ids.add(session.id)
+            _write_session_cache(session.id, time.time())
+        return session, False
+
+
 class BrowserbaseClient:
     """Browserbase client with session management and retry logic"""
 
@@ -34,10 +299,42 @@ class BrowserbaseClient:
             self.enabled = False
         else:
             self.enabled = True
-            self.bb = Browserbase(api_key=self.api_key)
+
+        # SDK client is built lazily on first use (see `bb`)
+        self._bb = None
+        self._bb_lock = threading.Lock()
+        self._close_fn = None
+        self._close_label = None
 
         self.max_retries = 3
-        self.retry_delay = 5  # seconds
+
+        # Retry backoff policy (seconds): base * 2**attempt, capped, plus jitter
+        self.backoff_base = 1.0
+        self.backoff_cap = 30.0
+        self.backoff_jitter = 0.5
+
+    @property
+    def bb(self):
+        """Browserbase SDK client, imported and constructed on first access"""
+        if self._bb is None:
+            with self._bb_lock:
+                if self._bb is None:
+                    from browserbase import Browserbase
+                    bb = Browserbase(api_key=self.api_key)
+
+                    # Resolve the session close method once for this SDK version
+                    for name, label in _CLOSE_METHODS:
+                        if hasattr(bb.sessions, name):
+                            self._close_fn = getattr(bb.sessions, name)
+                            self._close_label = label
+                            break
+
+                    self._bb = bb
+        return self._bb
+
+    def _backoff(self, attempt: int) -> float:
+        """Delay before the next retry under this client's backoff policy"""
+        return _compute_backoff(attempt, self.backoff_base, self.backoff_cap, self.backoff_jitter)
 
     def is_enabled(self) -> bool:
         """Check if Browserbase is enabled"""
@@ -57,27 +354,84 @@ class BrowserbaseClient:
             logger.warning("⚠️  Browserbase disabled - skipping session creation")
             return None
 
-        global _active_session, _session_creation_time
+        # Fast path: reuse the process's session without locking
+        if reuse:
+            session = self._current_session()
+            if session is not None:
+                return session
+
+        # Circuit open: Browserbase keeps rate limiting us, don't spend more quota
+        if _limits_for(self.project_id).breaker.is_open():
+            logger.warning("⚠️  Browserbase circuit open after repeated 429s - skipping session creation")
+            return None
 
-        # Reuse existing session if still valid
-        if reuse and _active_session and _session_creation_time:
-            age = time.time() - _session_creation_time
+        if not reuse:
+            return self._create_new_session()
+
+        global _creating
+        with _create_lock:
+            # Re-check under the lock in case another caller just created one
+            session = self._current_session()
+            if session is not None:
+                return session
+            pending = _creating
+            if pending is None:
+                pending = _creating = threading.Event()
+                creator = True
+            else:
+                creator = False
+
+        if not creator:
+            # Another caller is creating one - share its result (None if it failed) rather than retrying too
+            pending.wait()
+            return self._current_session()
+
+        try:
+            # Reuse a session persisted by a previous process (one GET instead of a create)
+            session = self._revive_cached_session()
+            if session is None:
+                session = self._create_new_session()
+            return session
+        finally:
+            with _create_lock:
+                _creating = None
+            pending.set()
+
+    def _current_session(self) -> Optional[any]:
+        """Return the process's session if it is still within SESSION_TIMEOUT"""
+        active = _active
+        if active is not None:
+            session, created_at = active
+            age = time.time() - created_at
             if age < SESSION_TIMEOUT:
                 logger.info(f"♻️  Reusing existing session (age: {age:.0f}s)")
-                return _active_session
+                return session
+        return None
 
-        # Create new session with retry logic
+    def _create_new_session(self) -> Optional[any]:
+        """Create a new session with retry logic and remember it for reuse"""
+        global _active
+        limits = _limits_for(self.project_id)
         for attempt in range(self.max_retries):
             try:
                 logger.info(f"📸 Creating Browserbase session (attempt {attempt + 1}/{self.max_retries})...")
+                limits.session.acquire()
                 session = self.bb.sessions.create(project_id=self.project_id)
 
                 if session and hasattr(session, 'id'):
                     logger.info(f"✅ Session created: {session.id[:20]}...")
+                    limits.breaker.record_success()
+                    _created_ids.add(session.id)
 
                     # Store for reuse
-                    _active_session = session
-                    _session_creation_time = time.time()
+                    created_at = time.time()
+                    with _create_lock:
+                        _active = (session, created_at)
+                    try:
+                        with _CacheLock():
+                            _write_session_cache(session.id, created_at)
+                    except OSError as e:
+                        logger.debug(f"Could not persist session: {e}")
 
                     return session
                 else:
@@ -86,39 +440,72 @@ class BrowserbaseClient:
 
             except Exception as e:
                 error_str = str(e)
+                kind = _classify(e, error_str)
 
-                # Handle rate limiting
-                if "429" in error_str or "Too Many Requests" in error_str.lower():
-                    logger.error(f"🚫 Browserbase rate limit exceeded!")
-                    logger.error(f"   {error_str}")
-
-                    if attempt < self.max_retries - 1:
-                        wait_time = self.retry_delay * (attempt + 1)
-                        logger.info(f"⏳ Waiting {wait_time}s before retry...")
-                        time.sleep(wait_time)
-                    else:
-                        logger.error("❌ Max retries exceeded - screenshots disabled for this run")
-                        return None
+                if kind == "rate_limit" and limits.breaker.record_rate_limit():
+                    logger.error(f"🚫 Browserbase circuit opened for {limits.breaker.cooldown}s after repeated 429s")
+                    return None
 
-                # Handle authentication errors
-                elif "401" in error_str or "unauthorized" in error_str.lower():
+                # Unrecoverable: bad credentials or project - fail immediately, no retries
+                if kind == "auth":
                     logger.error("❌ Browserbase authentication failed")
                     logger.error(f"   Check BROWSERBASE_API_KEY and BROWSERBASE_PROJECT_ID")
                     return None
 
-                # Handle other errors
-                else:
-                    logger.error(f"❌ Browserbase error: {error_str}")
+                if kind == "not_found":
+                    logger.error("❌ Browserbase project not found")
+                    logger.error(f"   Check BROWSERBASE_PROJECT_ID ({error_str})")
+                    return None
 
-                    if attempt < self.max_retries - 1:
-                        logger.info(f"⏳ Retrying in {self.retry_delay}s...")
-                        time.sleep(self.retry_delay)
+                if attempt >= self.max_retries - 1:
+                    if kind == "rate_limit":
+                        logger.error("❌ Max retries exceeded - screenshots disabled for this run")
                     else:
+                        logger.error(f"❌ Browserbase error: {error_str}")
                         logger.error("❌ Session creation failed after retries")
-                        return None
+                    return None
+
+                # Recoverable: rate limit (honor Retry-After) or transient error
+                if kind == "rate_limit":
+                    logger.error(f"🚫 Browserbase rate limit exceeded!")
+                    logger.error(f"   {error_str}")
+                    wait_time = _retry_after(e)
+                    if wait_time is None:
+                        wait_time = self._backoff(attempt)
+                    logger.info(f"⏳ Waiting {wait_time:.1f}s before retry...")
+                else:
+                    logger.error(f"❌ Browserbase error: {error_str}")
+                    wait_time = self._backoff(attempt)
+                    logger.info(f"⏳ Retrying in {wait_time:.1f}s...")
+                time.sleep(wait_time)
 
         return None
 
+    def _revive_cached_session(self) -> Optional[any]:
+        """Load a still-live session recorded on disk by an earlier run, if any"""
+        global _active
+        try:
+            with _CacheLock():
+                data = _read_session_cache()
+                if data is None:
+                    return None
+
+                session = self.bb.sessions.retrieve(data['id'])
+                status = getattr(session, 'status', 'RUNNING')
+                if not session or status != 'RUNNING':
+                    _write_session_cache(None)
+                    return None
+        except Exception as e:
+            logger.debug(f"Cached session not reusable: {e}")
+            return None
+
+        created_at = float(data['ts'])
+        with _create_lock:
+            _active = (session, created_at)
+        age = time.time() - created_at
+        logger.info(f"♻️  Reusing cached session (age: {age:.0f}s)")
+        return session
+
     def screenshot(self, session_id: str, url: str, code: Optional[str] = None) -> Optional[str]:
         """
         Capture screenshot from a session
@@ -148,8 +535,9 @@ class BrowserbaseClient:
                     logger.warning(f"⚠️  Failed to execute code in session: {e}")
 
             # Return screenshot URL
-            screenshot_url = f"https://www.browserbase.com/sessions/{session_id}"
-            logger.info(f"📸 Screenshot URL: {screenshot_url}")
+            screenshot_url = _SCREENSHOT_URL_TMPL(session_id)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("📸 Screenshot URL: %s", screenshot_url)
             return screenshot_url
 
         except Exception as e:
@@ -163,49 +551,47 @@ class BrowserbaseClient:
         Args:
             session_id: Session to close (if None, closes active session)
         """
+        global _active
         if not self.enabled:
             return
 
-        global _active_session, _session_creation_time
+        active = _active[0] if _active is not None else None
 
         try:
             # Determine which session to close
             if session_id:
                 logger.info(f"🔒 Closing session: {session_id[:20]}...")
-            elif _active_session and hasattr(_active_session, 'id'):
-                session_id = _active_session.id
+            elif active and hasattr(active, 'id'):
+                session_id = active.id
                 logger.info(f"🔒 Closing active session: {session_id[:20]}...")
             else:
                 logger.debug("No session to close")
                 return
 
-            # Try multiple methods to close session
+            # Close via the method resolved when the SDK client was built
             try:
-                # Method 1: Complete session
-                if hasattr(self.bb.sessions, 'complete'):
-                    self.bb.sessions.complete(session_id)
-                    logger.info("✅ Session completed")
-
-                # Method 2: Stop session
-                elif hasattr(self.bb.sessions, 'stop'):
-                    self.bb.sessions.stop(session_id)
-                    logger.info("✅ Session stopped")
-
-                # Method 3: Delete session
-                elif hasattr(self.bb.sessions, 'delete'):
-                    self.bb.sessions.delete(session_id)
-                    logger.info("✅ Session deleted")
-
+                self.bb  # ensure the SDK client (and close method) is resolved
+                if self._close_fn is not None:
+                    _limits_for(self.project_id).close.acquire()
+                    self._close_fn(session_id)
+                    logger.info(f"✅ Session {self._close_label}")
                 else:
                     logger.debug("⚠️  No close method available - session will auto-expire")
 
             except Exception as e:
                 logger.warning(f"⚠️  Session close failed (non-critical): {e}")
 
-            # Clear active session
-            if _active_session and hasattr(_active_session, 'id') and _active_session.id == session_id:
-                _active_session = None
-                _session_creation_time = None
+            _created_ids.discard(session_id)
+
+            # Clear active session (unless another caller replaced it meanwhile)
+            with _create_lock:
+                if _active is not None and getattr(_active[0], 'id', None) == session_id:
+                    _active = None
+
+            # Drop the on-disk record if it points at the closed session
+            cached = _read_session_cache()
+            if cached and cached.get('id') == session_id:
+                _write_session_cache(None)
 
         except Exception as e:
             logger.error(f"❌ Error during session cleanup: {e}")
@@ -215,22 +601,21 @@ class BrowserbaseClient:
         if not self.enabled:
             return
 
-        global _active_session
-
         logger.info("🔒 Closing all sessions...")
 
         # Close tracked session
-        if _active_session:
+        if _active is not None:
             self.close_session()
 
         # Try to list and close all sessions (if API supports it)
         try:
             if hasattr(self.bb.sessions, 'list'):
                 sessions = self.bb.sessions.list(project_id=self.project_id)
-                for session in sessions:
-                    if hasattr(session, 'id'):
-                        self.close_session(session.id)
-                        time.sleep(0.5)  # Rate limit friendly
+                session_ids = [s.id for s in sessions if hasattr(s, 'id')]
+
+                # Close in parallel; close_session is throttled by the project's close limiter
+                with ThreadPoolExecutor(max_workers=4, thread_name_prefix='bb-close') as pool:
+                    list(pool.map(self.close_session, session_ids))
 
             logger.info("✅ All sessions closed")
 
@@ -240,12 +625,15 @@ class BrowserbaseClient:
 
 # Global client instance
 _client = None
+_client_lock = threading.Lock()
 
 def get_client() -> BrowserbaseClient:
     """Get or create global Browserbase client"""
     global _client
     if _client is None:
-        _client = BrowserbaseClient()
+        with _client_lock:
+            if _client is None:
+                _client = BrowserbaseClient()
     return _client
 
 
@@ -274,14 +662,50 @@ def close_all_sessions():
     client.close_all_sessions()
 
 
+# Async wrappers - the Browserbase SDK is blocking, so run it off the event loop
+_bb_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='bb-')
+
+
+async def _run_in_executor(fn, *args):
+    # Run in a copy of the caller's context, like asyncio.to_thread
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_bb_executor, functools.partial(ctx.run, fn, *args))
+
+
+async def acreate_session(reuse: bool = True):
+    """Create or reuse a browser session without blocking the event loop"""
+    return await _run_in_executor(create_session, reuse)
+
+
+async def ascreenshot(session_id: str, url: str, code: Optional[str] = None) -> Optional[str]:
+    """Capture screenshot without blocking the event loop"""
+    return await _run_in_executor(screenshot, session_id, url, code)
+
+
+async def aclose_session(session_id: Optional[str] = None):
+    """Close session without blocking the event loop"""
+    await _run_in_executor(close_session, session_id)
+
+
 # Cleanup on module unload
 import atexit
 
 def cleanup():
-    """Cleanup function called on exit"""
+    """Cleanup function called on exit: close the sessions this process created, except the cached one"""
+    if not _created_ids:
+        return
     client = get_client()
     if client.is_enabled():
-        logger.info("🧹 Cleaning up Browserbase sessions...")
-        client.close_all_sessions()
+        # Leave the persisted session running so the next invocation can reuse it
+        cached = _read_session_cache()
+        handed_off = cached.get('id') if cached else None
+        if handed_off in _created_ids:
+            logger.info("♻️  Keeping cached session for the next run")
+        leftover = [session_id for session_id in _created_ids if session_id != handed_off]
+        if leftover:
+            logger.info("🧹 Cleaning up Browserbase sessions...")
+            for session_id in leftover:
+                client.close_session(session_id)
 
 atexit.register(cleanup)
@@ -1,94 +1,332 @@
 from e2b import AsyncSandbox
 import asyncio
+import contextlib
+import functools
+import logging
 import os
+import weakref
+from contextvars import ContextVar
+from typing import Callable, Optional
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Echo streamed command output as it arrives (off by default - it dominates large scans)
+_VERBOSE = os.getenv("AUTOCTF_VERBOSE", "0") == "1"
+
 # Global sandbox instance for reuse
 _sandbox = None
 
+# Sandbox pre-created at startup with its tools verified (see warm_sandbox)
+_warm_sandbox_id: Optional[str] = None
+
+# Lifetime of a warm sandbox nobody has claimed yet (get_sandbox extends it to the full 15 minutes)
+WARM_SANDBOX_TIMEOUT = 300
+
+# Serializes sandbox (re)creation; one lock per event loop since pentests run under their own loops
+_create_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+
+# Custom E2B template with the security tools pre-installed (see e2b.Dockerfile)
+E2B_TEMPLATE = os.getenv("E2B_TEMPLATE", "autoctf-sec-tools")
+
+# apt packages installed when the template is unavailable
+TOOLS = ["nmap", "nikto", "gobuster", "sqlmap", "curl", "wget", "git", "whois", "dnsutils"]
+
+# Binary -> apt package for every tool a command-not-found (exit 127) may install. Anything
+# else (a typo, a shell builtin, an unrelated program) is never installed or reinstalled
+_TOOL_PACKAGES = {
+    **{tool: tool for tool in TOOLS if tool != "dnsutils"},
+    "dig": "dnsutils", "nslookup": "dnsutils", "host": "dnsutils",
+}
+
+# Binaries probed in a single shell invocation (one RPC instead of one per tool)
+_VERIFY_TOOLS = ("nmap", "nikto", "gobuster", "sqlmap")
+_VERIFY_CMD = " && ".join(f"command -v {t}" for t in _VERIFY_TOOLS) + " && echo 'ALL_TOOLS_OK'"
+
+# DNS/whois lookups, whose answers don't change within a pentest run. Live probes of the
+# target (nmap, curl, ...) are never cached - a rescan must see the target as it is now
+_CACHEABLE = ("whois ", "dig ", "nslookup ", "host ")
+
+# Lookups of the pentest run in progress (command -> in-flight or finished task); see run_cache
+_run_cache: ContextVar[Optional[dict]] = ContextVar('_exec_run_cache', default=None)
+
+@contextlib.contextmanager
+def run_cache():
+    """Share DNS/whois lookup output between the commands of one pentest run"""
+    token = _run_cache.set({})
+    try:
+        yield
+    finally:
+        _run_cache.reset(token)
+
+async def _install_one(sandbox, tool: str) -> bool:
+    """Install the package providing a single known tool; returns True on success"""
+    package = _TOOL_PACKAGES.get(tool)
+    if package is None:
+        return False
+    logger.info(f"📦 Installing missing tool '{tool}' ({package})...")
+    try:
+        result = await sandbox.commands.run(
+            f"export DEBIAN_FRONTEND=noninteractive && "
+            f"sudo apt-get install -y -qq --no-install-recommends {package}",
+            timeout=60
+        )
+        return result.exit_code == 0
+    except Exception as e:
+        logger.warning(f"⚠️ Install of '{package}' failed: {e}")
+        return False
+
+async def _verify(sandbox) -> bool:
+    """Check that all required security tools are on the sandbox PATH (False on any error)"""
+    try:
+        result = await sandbox.commands.run(_VERIFY_CMD, timeout=30)
+    except Exception as e:
+        # e2b >= 1.0 raises CommandExitException for the non-zero exit of a missing tool
+        logger.debug(f"Tool verification failed: {e}")
+        return False
+    return "ALL_TOOLS_OK" in result.stdout
+
+async def _create_sandbox(timeout: int = 900):
+    """Create a sandbox (15 minute timeout by default), preferring the pre-baked template"""
+    try:
+        sandbox = await AsyncSandbox.create(template=E2B_TEMPLATE, timeout=timeout)
+        logger.info(f"✅ E2B Sandbox created from template '{E2B_TEMPLATE}' ({timeout}s timeout)")
+    except Exception as e:
+        logger.warning(f"⚠️ Template '{E2B_TEMPLATE}' unavailable ({e}), using default image")
+        sandbox = await AsyncSandbox.create(timeout=timeout)
+        logger.info(f"✅ E2B Sandbox created ({timeout}s timeout)")
+    return sandbox
+
+async def _ensure_tools(sandbox):
+    """Make sure the security tools are installed in a sandbox"""
+    # Fast path: template already has the tools, nothing to install
+    if await _verify(sandbox):
+        logger.info("✅ Security tools verified and ready")
+        return
+
+    # Install required security tools
+    logger.info("📦 Installing security tools (this may take up to 3 minutes)...")
+    try:
+        # First, update package lists (with sudo)
+        update_cmd = "sudo apt-get update -qq -o Acquire::Languages=none"
+        logger.info("  → Updating package lists...")
+        update_result = await sandbox.commands.run(update_cmd, timeout=120)
+        logger.info(f"  → Update exit code: {update_result.exit_code}")
+
+        # Install all tools in one apt invocation (with sudo); wait out a concurrent install's lock
+        install_cmd = f"""
+        export DEBIAN_FRONTEND=noninteractive && \
+        sudo apt-get install -y -qq --no-install-recommends \
+            -o Acquire::Languages=none -o APT::Install-Suggests=false -o DPkg::Lock::Timeout=180 \
+            {' '.join(TOOLS)} 2>&1 | grep -E "Setting up|Unpacking|E:|W:" || true
+        """
+
+        logger.info(f"  → Installing tools: {', '.join(TOOLS)}")
+        result = await sandbox.commands.run(install_cmd, timeout=300)
+
+        if result.stdout:
+            logger.info(f"  → Install output: {result.stdout[:500]}")
+        if result.stderr:
+            logger.info(f"  → Install stderr: {result.stderr[:500]}")
+
+        # Verify tools are installed
+        if await _verify(sandbox):
+            logger.info("✅ Security tools verified and ready")
+        else:
+            error_msg = f"Tool verification failed. Some tools may not be installed correctly."
+            logger.error(f"❌ {error_msg}")
+            logger.info(f"  → Expected on PATH: {', '.join(_VERIFY_TOOLS)}")
+            # Don't fail completely, but log the issue
+            logger.warning("⚠️ Continuing anyway, but some scans may fail...")
+
+    except Exception as e:
+        error_msg = f"Failed to install security tools: {str(e)}"
+        logger.error(f"❌ {error_msg}")
+        logger.warning("⚠️ Sandbox created but tools unavailable. Scans will likely fail.")
+        # Don't fail completely to avoid breaking the whole system
+
+async def _kill(sandbox):
+    """Kill a sandbox, ignoring errors (E2B reclaims it on timeout anyway)"""
+    try:
+        await sandbox.kill()
+    except Exception:
+        pass
+
+async def warm_sandbox() -> bool:
+    """
+    Create a sandbox ahead of time for the first get_sandbox() call to reconnect to
+
+    The sandbox is only kept when it already has the tools (template image), so there is
+    no install left running in the background; otherwise it is killed, as it is on any
+    failure or cancellation. A kept sandbox is handed over by ID, so the pentest worker's
+    own event loop can connect to it, and expires after WARM_SANDBOX_TIMEOUT if unclaimed.
+
+    Returns:
+        True if the sandbox has the tools (this also proves command execution works)
+    """
+    global _warm_sandbox_id
+    # Re-validation (e.g. a health check) reuses the still-unclaimed warm sandbox
+    if _warm_sandbox_id:
+        try:
+            sandbox = await AsyncSandbox.connect(_warm_sandbox_id)
+            if await _verify(sandbox):
+                return True
+        except Exception:
+            pass
+        _warm_sandbox_id = None
+
+    sandbox = await _create_sandbox(timeout=WARM_SANDBOX_TIMEOUT)
+    try:
+        ready = await _verify(sandbox)
+    except BaseException:
+        await _kill(sandbox)
+        raise
+    # Nothing to hand over to if scans already have their sandbox
+    if not ready or _sandbox is not None:
+        await _kill(sandbox)
+        return ready
+    _warm_sandbox_id = sandbox.sandbox_id
+    return True
+
 async def get_sandbox():
     """Get or create a sandbox instance"""
-    global _sandbox
-    if _sandbox is None:
-        # Create sandbox with longer timeout (15 minutes)
-        _sandbox = await AsyncSandbox.create(timeout=900)
-        print("✅ E2B Sandbox created (15 min timeout)")
+    global _sandbox, _warm_sandbox_id
+    if _sandbox is not None:
+        return _sandbox
 
-        # Install required security tools
-        print("📦 Installing security tools (this may take up to 3 minutes)...")
-        try:
-            # First, update package lists (with sudo)
-            update_cmd = "sudo apt-get update -qq"
-            print("  → Updating package lists...")
-            update_result = await _sandbox.commands.run(update_cmd, timeout=120)
-            print(f"  → Update exit code: {update_result.exit_code}")
-
-            # Install tools one by one for better visibility (with sudo)
-            tools = ["nmap", "nikto", "gobuster", "sqlmap", "curl", "wget", "git", "whois", "dnsutils"]
-            install_cmd = f"""
-            export DEBIAN_FRONTEND=noninteractive && \
-            sudo apt-get install -y -qq {' '.join(tools)} 2>&1 | grep -E "Setting up|Unpacking|E:|W:" || true
-            """
-
-            print(f"  → Installing tools: {', '.join(tools)}")
-            result = await _sandbox.commands.run(install_cmd, timeout=300)
-
-            if result.stdout:
-                print(f"  → Install output: {result.stdout[:500]}")
-            if result.stderr:
-                print(f"  → Install stderr: {result.stderr[:500]}")
-
-            # Verify tools are installed
-            verify_cmd = "command -v nmap && command -v nikto && command -v gobuster && command -v sqlmap && echo 'ALL_TOOLS_OK'"
-            verify_result = await _sandbox.commands.run(verify_cmd, timeout=30)
-
-            if "ALL_TOOLS_OK" in verify_result.stdout:
-                print("✅ Security tools verified and ready")
-            else:
-                error_msg = f"Tool verification failed. Some tools may not be installed correctly."
-                print(f"❌ {error_msg}")
-                print(f"  → Verify output: {verify_result.stdout}")
-                print(f"  → Verify stderr: {verify_result.stderr}")
-                # Don't fail completely, but log the issue
-                print("⚠️ Continuing anyway, but some scans may fail...")
-
-        except Exception as e:
-            error_msg = f"Failed to install security tools: {str(e)}"
-            print(f"❌ {error_msg}")
-            print("⚠️ Sandbox created but tools unavailable. Scans will likely fail.")
-            # Don't fail completely to avoid breaking the whole system
+    lock = _create_locks.setdefault(asyncio.get_running_loop(), asyncio.Lock())
+    async with lock:
+        # Another caller may have created it while we waited for the lock
+        if _sandbox is not None:
+            return _sandbox
+
+        sandbox = None
+        # Reuse the sandbox warmed at startup if it's still alive
+        if _warm_sandbox_id:
+            try:
+                sandbox = await AsyncSandbox.connect(_warm_sandbox_id)
+                await sandbox.set_timeout(900)
+                logger.info(f"✅ Reconnected to warm E2B Sandbox {_warm_sandbox_id[:12]} (tools verified at startup)")
+            except Exception as e:
+                logger.warning(f"⚠️ Warm sandbox unavailable ({e}), creating a new one")
+                sandbox = None
+            _warm_sandbox_id = None
+
+        if sandbox is None:
+            sandbox = await _create_sandbox()
+            await _ensure_tools(sandbox)
+
+        # Publish only once the tools are ready
+        _sandbox = sandbox
 
     return _sandbox
 
-async def exec_command(command: str, timeout=120):
-    """Execute command in E2B sandbox with error handling"""
+async def exec_command(command: str, timeout=120, on_chunk: Optional[Callable[[str], None]] = None):
+    """
+    Execute command in E2B sandbox with error handling
+
+    Args:
+        on_chunk: Optional callback receiving stdout/stderr chunks as they arrive (interleaved
+            in arrival order; the returned output is still stdout followed by stderr)
+    """
+    cache = _run_cache.get()
+    if cache is None or not command.startswith(_CACHEABLE):
+        output, _ = await _run_command(command, timeout, on_chunk)
+        return output
+
+    # Single-flight: callers of the same lookup in this run share one execution
+    flight = cache.get(command)
+    if flight is None:
+        flight = cache[command] = asyncio.ensure_future(_run_command(command, timeout, on_chunk))
+        on_chunk = None  # the first caller streams it live
+    else:
+        logger.info(f"[Exec MCP] Cached: {command[:100]}...")
+    try:
+        # Shielded: one caller giving up doesn't cancel the lookup for the others
+        output, exit_code = await asyncio.shield(flight)
+    except Exception:
+        if cache.get(command) is flight:
+            del cache[command]  # let a later caller retry
+        raise
+    if exit_code != 0 and cache.get(command) is flight:
+        del cache[command]
+    if on_chunk:
+        on_chunk(output)
+    return output
+
+async def exec_many(commands: list[str], timeout=120,
+                    on_chunk: Optional[Callable[[str, str], None]] = None) -> list:
+    """
+    Execute independent commands concurrently in the shared sandbox
+
+    Wall time is roughly the slowest command rather than the sum. Results are
+    returned in input order; a command that failed yields its exception.
+
+    Args:
+        on_chunk: Optional callback receiving (command, chunk) as each command's output arrives
+    """
+    await get_sandbox()  # create once up front so the commands don't race to boot it
+    return await asyncio.gather(
+        *(exec_command(c, timeout=timeout, on_chunk=functools.partial(on_chunk, c) if on_chunk else None)
+          for c in commands),
+        return_exceptions=True
+    )
+
+async def _stream(sandbox, command: str, timeout, on_chunk):
+    """
+    Run a command, passing output chunks to on_chunk (and the verbose log) as they arrive
+
+    The SDK still collects the full stdout/stderr into the returned result.
+    """
+    if not on_chunk and not _VERBOSE:
+        return await sandbox.commands.run(command, timeout=timeout)
+
+    def forward(data):
+        if _VERBOSE:
+            logger.info("%s", data.rstrip())
+        if on_chunk:
+            on_chunk(data)
+
+    return await sandbox.commands.run(command, timeout=timeout, on_stdout=forward, on_stderr=forward)
+
+async def _run_command(command: str, timeout=120, on_chunk=None):
+    """Run a command in the sandbox, returning (output, exit_code)"""
     try:
         sandbox = await get_sandbox()
-        print(f"[Exec MCP] Running: {command[:100]}...")
+        logger.info(f"[Exec MCP] Running: {command[:100]}...")
 
-        result = await sandbox.commands.run(command, timeout=timeout)
+        result = await _stream(sandbox, command, timeout, on_chunk)
 
-        # Check for command not found errors
-        if result.exit_code == 127:
-            tool = command.split()[0]
+        # Check for command not found errors (only known tools are installed and retried)
+        tool = command.split(maxsplit=1)[0] if command.strip() else ""
+        if result.exit_code == 127 and tool in _TOOL_PACKAGES:
             error_msg = f"❌ Tool '{tool}' not found in E2B sandbox"
-            print(error_msg)
-            print(f"   Exit code: {result.exit_code}")
-            print(f"   Stdout: {result.stdout[:200]}")
-            print(f"   Stderr: {result.stderr[:200]}")
+            logger.error(error_msg)
+            logger.error(f"   Exit code: {result.exit_code}")
+            logger.error(f"   Stdout: {result.stdout[:200]}")
+            logger.error(f"   Stderr: {result.stderr[:200]}")
 
-            # Try to reinstall tools
-            print("🔄 Attempting to reinstall security tools...")
-            global _sandbox
-            _sandbox = None  # Force recreation
-            sandbox = await get_sandbox()
+            # Usually just one missing tool: install it in place before recreating the sandbox
+            if await _install_one(sandbox, tool):
+                logger.info(f"🔄 Retrying command: {command[:100]}...")
+                result = await _stream(sandbox, command, timeout, on_chunk)
 
-            # Retry the command once
-            print(f"🔄 Retrying command: {command[:100]}...")
-            result = await sandbox.commands.run(command, timeout=timeout)
+            if result.exit_code == 127:
+                # Fall back to a fresh sandbox with the full tool install
+                logger.info("🔄 Attempting to reinstall security tools...")
+                global _sandbox
+                if _sandbox is sandbox:
+                    _sandbox = None  # Force recreation (unless a concurrent command already did)
+                sandbox = await get_sandbox()
+
+                # Retry the command once
+                logger.info(f"🔄 Retrying command: {command[:100]}...")
+                result = await _stream(sandbox, command, timeout, on_chunk)
 
             if result.exit_code == 127:
                 raise RuntimeError(f"Tool '{tool}' still not found after reinstall attempt. E2B sandbox may not support required packages.")
@@ -96,19 +334,19 @@ async def exec_command(command: str, timeout=120):
         output = result.stdout + "\n" + result.stderr
 
         # Check for actual errors (non-zero exit codes)
-        if result.exit_code != 0 and result.exit_code != 127:
-            print(f"⚠️ Command exited with code {result.exit_code}")
+        if result.exit_code != 0:
+            logger.warning(f"⚠️ Command exited with code {result.exit_code}")
             if result.stderr:
-                print(f"   Stderr: {result.stderr[:300]}")
+                logger.warning(f"   Stderr: {result.stderr[:300]}")
 
-        return output
+        return output, result.exit_code
 
     except Exception as e:
         error_msg = f"Command execution failed: {str(e)}"
-        print(f"❌ {error_msg}")
+        logger.error(f"❌ {error_msg}")
         # Include more context in the error
         if hasattr(e, '__cause__') and e.__cause__:
-            print(f"   Root cause: {str(e.__cause__)}")
+            logger.error(f"   Root cause: {str(e.__cause__)}")
         raise RuntimeError(error_msg) from e
 
 async def close_sandbox():
@@ -118,7 +356,7 @@ async def close_sandbox():
         try:
             # E2B sandboxes auto-cleanup on timeout
             # Manual cleanup: await _sandbox.kill() if needed
-            print("🔒 Sandbox will auto-cleanup on timeout")
+            logger.info("🔒 Sandbox will auto-cleanup on timeout")
         except:
             pass
         _sandbox = None
\ No newline at end of file
@@ -3,13 +3,24 @@ GitHub Client with Token Validation and Fail-Fast Errors
 Validates token scopes and provides clear error messages
 """
 
-from github import Github, GithubException
-import github
 import os
+import asyncio
+import atexit
 import base64
+import hashlib
+import io
+import itertools
+import json
 import logging
+import re
+import threading
+import time
+from pathlib import Path
 from dotenv import load_dotenv
-from typing import Optional, Dict
+from typing import Optional, Dict, Union
+
+# The HTTP stacks (requests/urllib3, httpx/h2) and PyGithub are imported inside the methods
+# that use them, so importing this module for create_pr stays cheap
 
 # Load environment variables
 load_dotenv()
@@ -18,6 +29,84 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+GITHUB_API_URL = "https://api.github.com"
+GITHUB_GRAPHQL_URL = f"{GITHUB_API_URL}/graphql"
+
+# Rotate off a token (until its window resets) once it has fewer requests left than this
+RATE_LIMIT_FLOOR = 100
+
+# ETag cache for conditional GETs (304 responses don't count against the rate limit)
+_ETAG_CACHE_PATH = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'autoctf' / 'github_etags.json'
+
+# Most URLs kept in the ETag cache (least recently used are dropped first)
+ETAG_CACHE_MAX_ENTRIES = 256
+
+# Successful validations are reused across processes for this long (seconds)
+_VALIDATION_CACHE_PATH = _ETAG_CACHE_PATH.with_name('token_validation.json')
+VALIDATION_TTL = 300
+
+# Keep-alive pool size shared by PyGithub and the direct GraphQL calls
+HTTP_POOL_SIZE = 20
+
+# Substrings that mark a token as a placeholder (single case-insensitive scan)
+_PLACEHOLDER_RE = re.compile(r'xxx|placeholder|example|your_token', re.IGNORECASE)
+
+# Resolve the current head commit of a branch (needed as expectedHeadOid)
+_BRANCH_HEAD_QUERY = """
+query($owner: String!, $name: String!, $ref: String!) {
+  repository(owner: $owner, name: $name) {
+    ref(qualifiedName: $ref) { target { oid } }
+  }
+}
+"""
+
+# Authentication, repository access/permission and rate limit in one request
+_VALIDATION_QUERY = """
+query($owner: String!, $name: String!) {
+  viewer { login }
+  repository(owner: $owner, name: $name) { name viewerPermission }
+  rateLimit { remaining limit }
+}
+"""
+
+# Repository permissions that allow pushing branches
+_PUSH_PERMISSIONS = ("WRITE", "MAINTAIN", "ADMIN")
+
+# Default branch name and its head commit in one request
+_DEFAULT_BRANCH_QUERY = """
+query($owner: String!, $name: String!) {
+  repository(owner: $owner, name: $name) {
+    defaultBranchRef { name target { oid } }
+  }
+}
+"""
+
+# Commit any number of file additions/updates to a branch in a single request
+_CREATE_COMMIT_MUTATION = """
+mutation($input: CreateCommitOnBranchInput!) {
+  createCommitOnBranch(input: $input) { commit { oid url } }
+}
+"""
+
+def _import_httpx():
+    """
+    httpx, when it and h2 are installed
+
+    Optional HTTP/2 transport: concurrent direct API calls multiplex over one TLS connection.
+    """
+    try:
+        import httpx
+        import h2  # noqa: F401 - required by httpx for http2=True
+    except ImportError:
+        return None
+    return httpx
+
+def _b64(content: Union[str, bytes]) -> str:
+    """Base64-encode file content for the contents/commit APIs (bytes are used as-is)"""
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return base64.b64encode(content).decode("ascii")
+
 class GitHubClientError(Exception):
     """Raised when GitHub client encounters an error"""
     pass
@@ -26,19 +115,83 @@ class GitHubClient:
     """GitHub client with validation and error handling"""
 
     def __init__(self):
-        self.token = os.getenv("GITHUB_TOKEN")
+        # GITHUB_TOKENS (comma-separated) spreads read-only GETs over several rate-limit budgets
+        self._tokens = [t.strip() for t in os.getenv("GITHUB_TOKENS", "").split(",") if t.strip()]
+        self.token = os.getenv("GITHUB_TOKEN") or (self._tokens[0] if self._tokens else None)
+        if self.token and self.token not in self._tokens:
+            self._tokens.insert(0, self.token)
+        self._token_cycle = itertools.cycle(self._tokens)
+        self._rate_state: Dict[str, tuple] = {}  # token -> (remaining, reset epoch)
+        self._token_lock = threading.Lock()
         self.repo_name = os.getenv("GITHUB_REPO")
 
         # Validate configuration
         self._validate_config()
 
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        httpx = _import_httpx()
+
+        # Network errors raised by whichever transport the direct API calls use
+        self._transport_errors = (requests.RequestException,) + ((httpx.HTTPError,) if httpx else ())
+
+        # One pooled keep-alive session so TLS handshakes are amortized across calls
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(
+            pool_connections=HTTP_POOL_SIZE,
+            pool_maxsize=HTTP_POOL_SIZE,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+        ))
+        self._h2 = httpx.Client(transport=httpx.HTTPTransport(
+            http2=True,
+            retries=3,
+            limits=httpx.Limits(max_keepalive_connections=HTTP_POOL_SIZE)
+        )) if httpx else None
+        self.g = None
+        self._repo = None
+        self._etag_cache = self._load_etag_cache()
+
         # Initialize client
         if self.token and self.repo_name:
-            auth = github.Auth.Token(self.token)
-            self.g = Github(auth=auth)
+            from github import Auth, Github  # PyGithub is the bulk of this module's import cost
+            auth = Auth.Token(self.token)
+            self.g = Github(auth=auth, pool_size=HTTP_POOL_SIZE)
             self._validate_connection()
-        else:
-            self.g = None
+
+    def close(self):
+        """Release pooled HTTP connections and persist the ETag cache"""
+        self._save_etag_cache()
+        self._session.close()
+        if self._h2 is not None:
+            self._h2.close()
+        if self.g is not None and hasattr(self.g, 'close'):
+            self.g.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @classmethod
+    def preflight(cls) -> bool:
+        """
+        Build and validate the shared client once at startup (fail fast if misconfigured)
+
+        Returns:
+            True if the client is ready, False if configuration or access is broken
+        """
+        try:
+            get_client()
+            logger.info("✅ GitHub client initialized successfully")
+            return True
+        except GitHubClientError as e:
+            logger.error(f"❌ GitHub client initialization failed: {e}")
+            logger.error("   Fix GitHub configuration before running pentests")
+        except Exception as e:
+            logger.warning(f"⚠️  GitHub client pre-validation skipped: {e}")
+        return False
 
     def _validate_config(self):
         """Validate GitHub configuration"""
@@ -65,24 +218,108 @@ class GitHubClient:
 
     def _is_placeholder(self, value: str) -> bool:
         """Check if token is a placeholder"""
-        if value.count('x') > len(value) * 0.5:
+        # No ghp_/github_pat_ prefix fast path: the documented placeholders
+        # (ghp_your_token_here, ghp_xxxx...) carry real prefixes too
+        if _PLACEHOLDER_RE.search(value):
             return True
-        placeholder_patterns = ['xxx', 'placeholder', 'example', 'your_token']
-        return any(p in value.lower() for p in placeholder_patterns)
+        return value.count('x') * 2 > len(value)
 
-    def _validate_connection(self):
-        """Validate GitHub connection and permissions"""
+    def _validation_fingerprint(self, token: str) -> str:
+        """Cache key for a token/repository pair (the token itself is never stored)"""
+        return hashlib.sha256(f"{token}:{self.repo_name}".encode()).hexdigest()[:16]
+
+    def _cached_validation(self, token: str) -> Optional[dict]:
+        """Return a recent successful validation of this token/repo, if any"""
+        try:
+            entry = json.loads(_VALIDATION_CACHE_PATH.read_text()).get(self._validation_fingerprint(token))
+        except (OSError, ValueError, AttributeError):
+            return None
+        if entry and time.time() - entry.get("validated_at", 0) < VALIDATION_TTL:
+            return entry
+        return None
+
+    def _store_validation(self, token: str, login: str, permission: str):
+        """Record a successful validation (owner-only file permissions)"""
         try:
-            # Test authentication
-            user = self.g.get_user()
-            logger.info(f"✅ Authenticated as: {user.login}")
+            cache = json.loads(_VALIDATION_CACHE_PATH.read_text())
+        except (OSError, ValueError):
+            cache = {}
+        now = time.time()
+        cache = {fp: e for fp, e in cache.items() if now - e.get("validated_at", 0) < VALIDATION_TTL}
+        cache[self._validation_fingerprint(token)] = {"validated_at": now, "login": login, "permission": permission}
+        try:
+            _VALIDATION_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = _VALIDATION_CACHE_PATH.with_suffix('.tmp')
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                os.fchmod(f.fileno(), 0o600)
+                json.dump(cache, f)
+            os.replace(tmp_path, _VALIDATION_CACHE_PATH)
+        except OSError as e:
+            logger.debug(f"Could not save validation cache: {e}")
+
+    def _check_token(self, token: str) -> dict:
+        """
+        Authenticate a token and read its repository access (one GraphQL round-trip)
 
-            # Test repository access
-            repo = self.g.get_repo(self.repo_name)
-            logger.info(f"✅ Repository access: {repo.name}")
+        Returns:
+            The validation query's data (viewer, repository, rateLimit)
+
+        Raises:
+            GitHubClientError: If the token is rejected or can't see the repository
+        """
+        owner, name = self.repo_name.split("/", 1)
+        try:
+            response = self._request(
+                "POST",
+                GITHUB_GRAPHQL_URL,
+                json={"query": _VALIDATION_QUERY, "variables": {"owner": owner, "name": name}},
+                timeout=30,
+                token=token
+            )
+        except self._transport_errors as e:
+            raise GitHubClientError(f"GitHub API error: {e}")
+
+        if response.status_code == 401:
+            raise GitHubClientError(
+                "GitHub authentication failed (401). "
+                "Token may be invalid or expired. "
+                "Generate new token at: https://github.com/settings/tokens"
+            )
+        elif response.status_code == 403:
+            raise GitHubClientError(
+                "GitHub API access forbidden (403). "
+                "Check token scopes include 'repo' and 'workflow'."
+            )
+        elif response.status_code != 200:
+            raise GitHubClientError(f"GitHub API error ({response.status_code}): {response.text[:200]}")
+
+        payload = response.json()
+        data = payload.get("data") or {}
+        if not data.get("viewer"):
+            errors = payload.get("errors") or [{}]
+            raise GitHubClientError(f"GitHub API error: {errors[0].get('message', 'empty response')}")
+
+        if not data.get("repository"):
+            raise GitHubClientError(
+                f"Repository not found: {self.repo_name}. "
+                "Check GITHUB_REPO format (owner/repository) and permissions."
+            )
+        return data
+
+    def _validate_connection(self):
+        """Validate the primary token (write access) and the extra read-only GITHUB_TOKENS"""
+        cached = self._cached_validation(self.token)
+        if cached:
+            logger.info(f"✅ Authenticated as: {cached['login']} (cached)")
+        else:
+            data = self._check_token(self.token)
+            repo = data["repository"]
+            logger.info(f"✅ Authenticated as: {data['viewer']['login']}")
+            logger.info(f"✅ Repository access: {repo['name']}")
 
             # Check write permissions
-            if not repo.permissions.push:
+            if repo.get("viewerPermission") not in _PUSH_PERMISSIONS:
                 raise GitHubClientError(
                     f"GitHub token lacks write permissions to {self.repo_name}. "
                     "Ensure token has 'repo' scope and you have push access."
@@ -91,49 +328,239 @@ class GitHubClient:
             logger.info("✅ Write permissions verified")
 
             # Check rate limit
-            rate_limit = self.g.get_rate_limit()
-            remaining = rate_limit.core.remaining
-            if remaining < 100:
+            rate_limit = data["rateLimit"]
+            remaining = rate_limit["remaining"]
+            if remaining < RATE_LIMIT_FLOOR:
                 logger.warning(f"⚠️  Low GitHub API rate limit: {remaining} requests remaining")
             else:
-                logger.info(f"✅ API rate limit: {remaining}/{rate_limit.core.limit}")
+                logger.info(f"✅ API rate limit: {remaining}/{rate_limit['limit']}")
 
-        except GithubException as e:
-            if e.status == 401:
-                raise GitHubClientError(
-                    "GitHub authentication failed (401). "
-                    "Token may be invalid or expired. "
-                    "Generate new token at: https://github.com/settings/tokens"
-                )
-            elif e.status == 404:
-                raise GitHubClientError(
-                    f"Repository not found: {self.repo_name}. "
-                    "Check GITHUB_REPO format (owner/repository) and permissions."
-                )
-            elif e.status == 403:
-                raise GitHubClientError(
-                    "GitHub API access forbidden (403). "
-                    "Check token scopes include 'repo' and 'workflow'."
-                )
-            else:
-                raise GitHubClientError(f"GitHub API error: {e.data.get('message', str(e))}")
+            self._store_validation(self.token, data["viewer"]["login"], repo["viewerPermission"])
+
+        # Extra tokens only serve rotated GETs, so read access is enough; drop any that fail
+        valid = [self.token]
+        for token in self._tokens:
+            if token == self.token:
+                continue
+            try:
+                if self._is_placeholder(token):
+                    raise GitHubClientError("token appears to be a placeholder")
+                if not self._cached_validation(token):
+                    data = self._check_token(token)
+                    self._store_validation(token, data["viewer"]["login"], data["repository"]["viewerPermission"])
+                valid.append(token)
+            except GitHubClientError as e:
+                logger.warning(f"⚠️  Ignoring GITHUB_TOKENS entry {token[:8]}...: {e}")
+        with self._token_lock:
+            self._tokens = valid
+            self._token_cycle = itertools.cycle(valid)
+        if len(valid) > 1:
+            logger.info(f"✅ Rotating read-only requests over {len(valid)} tokens")
+
+    @staticmethod
+    def _load_etag_cache() -> Dict[str, list]:
+        """Load persisted {url: [etag, body]} entries from a previous run"""
+        try:
+            cache = json.loads(_ETAG_CACHE_PATH.read_text())
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(cache, dict):
+            return {}
+        return dict(list(cache.items())[-ETAG_CACHE_MAX_ENTRIES:])
+
+    def _save_etag_cache(self):
+        """Atomically persist the ETag cache (owner-only file permissions - it holds private repo contents)"""
+        if not self._etag_cache:
+            return
+        try:
+            _ETAG_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = _ETAG_CACHE_PATH.with_suffix('.tmp')
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                os.fchmod(f.fileno(), 0o600)
+                json.dump(dict(list(self._etag_cache.items())[-ETAG_CACHE_MAX_ENTRIES:]), f)
+            os.replace(tmp_path, _ETAG_CACHE_PATH)
+        except OSError as e:
+            logger.debug(f"Could not save ETag cache: {e}")
+
+    def _rest_get(self, path: str, params: Optional[dict] = None):
+        """
+        Conditional REST GET, revalidating against the cached ETag
+
+        Returns:
+            (status_code, parsed JSON body) - a 304 is returned as 200 with the cached body
+        """
+        import requests  # already loaded by __init__
+        request = requests.Request("GET", f"{GITHUB_API_URL}{path}", params=params).prepare()
+        key = request.url
+        cached = self._etag_cache.get(key)
+        headers = {"If-None-Match": cached[0]} if cached else None
+
+        response = self._request("GET", request.url, headers=headers, timeout=30)
+        if response.status_code == 304 and cached:
+            # Move to the most recently used end
+            self._etag_cache.pop(key, None)
+            self._etag_cache[key] = cached
+            return 200, cached[1]
+
+        body = response.json() if response.content else None
+        if response.status_code == 200 and response.headers.get("ETag"):
+            self._etag_cache.pop(key, None)
+            self._etag_cache[key] = [response.headers["ETag"], body]
+            while len(self._etag_cache) > ETAG_CACHE_MAX_ENTRIES:
+                del self._etag_cache[next(iter(self._etag_cache))]
+        return response.status_code, body
+
+    def _next_token(self) -> str:
+        """Pick the next token round-robin, skipping ones that are near their rate limit"""
+        with self._token_lock:
+            now = time.time()
+            for _ in range(len(self._tokens)):
+                token = next(self._token_cycle)
+                remaining, reset = self._rate_state.get(token, (RATE_LIMIT_FLOOR, 0))
+                if remaining >= RATE_LIMIT_FLOOR or now >= reset:
+                    return token
+            # Every token is low - use whichever has the most left
+            return max(self._tokens, key=lambda t: self._rate_state[t][0])
+
+    def _request(self, method: str, url: str, headers: Optional[dict] = None, token: Optional[str] = None, **kwargs):
+        """
+        Send a direct API request (HTTP/2 when available)
+
+        Read-only GETs rotate over the validated tokens; everything else (writes and
+        GraphQL) uses the given token or the primary GITHUB_TOKEN.
+        """
+        if token is None:
+            token = self._next_token() if method == "GET" else self.token
+        headers = {"Authorization": f"bearer {token}", "Accept": "application/vnd.github+json", **(headers or {})}
+        client = self._h2 or self._session
+        response = client.request(method, url, headers=headers, **kwargs)
+
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        if remaining is not None:
+            with self._token_lock:
+                self._rate_state[token] = (int(remaining), int(response.headers.get("X-RateLimit-Reset", 0)))
+        return response
+
+    def _graphql(self, query: str, variables: Optional[dict] = None) -> dict:
+        """Run a GraphQL query against the GitHub API and return its data"""
+        response = self._request(
+            "POST",
+            GITHUB_GRAPHQL_URL,
+            json={"query": query, "variables": variables or {}},
+            timeout=30
+        )
+        if response.status_code != 200:
+            raise GitHubClientError(f"GitHub GraphQL error ({response.status_code}): {response.text[:200]}")
+
+        payload = response.json()
+        if payload.get("errors"):
+            raise GitHubClientError(f"GitHub GraphQL error: {payload['errors'][0].get('message')}")
+        return payload["data"]
+
+    def _commit_files_graphql(self, branch: str, encoded: Dict[str, str], message: str) -> str:
+        """
+        Commit all files to a branch with one createCommitOnBranch mutation
+
+        Args:
+            encoded: Dict of file paths to base64-encoded content
+
+        Returns:
+            OID of the new commit
+        """
+        owner, name = self.repo_name.split("/", 1)
+
+        data = self._graphql(_BRANCH_HEAD_QUERY, {"owner": owner, "name": name, "ref": f"refs/heads/{branch}"})
+        ref = data["repository"]["ref"]
+        if not ref:
+            raise GitHubClientError(f"Branch not found: {branch}")
+
+        additions = [{"path": path, "contents": b64} for path, b64 in encoded.items()]
+        data = self._graphql(_CREATE_COMMIT_MUTATION, {"input": {
+            "branch": {"repositoryNameWithOwner": self.repo_name, "branchName": branch},
+            "message": {"headline": message},
+            "fileChanges": {"additions": additions},
+            "expectedHeadOid": ref["target"]["oid"],
+        }})
+        return data["createCommitOnBranch"]["commit"]["oid"]
+
+    def _probe_sha(self, path: str, ref: str) -> Optional[str]:
+        """Blob SHA of a file on a ref, or None if it doesn't exist"""
+        try:
+            status, body = self._rest_get(f"/repos/{self.repo_name}/contents/{path}", {"ref": ref})
+        except self._transport_errors as e:
+            logger.error(f"  ❌ Failed to check {path}: {e}")
+            raise GitHubClientError(f"File upload failed for {path}")
+        if status == 404:
+            return None
+        if status != 200 or not isinstance(body, dict):
+            message = body.get('message', status) if isinstance(body, dict) else status
+            logger.error(f"  ❌ Failed to check {path}: {message}")
+            raise GitHubClientError(f"File upload failed for {path}")
+        return body["sha"]
+
+    def _put_file(self, path: str, b64: str, message: str, branch: str, sha: Optional[str] = None):
+        """Create or update a file with already base64-encoded content (PUT /contents)"""
+        payload = {"message": message, "content": b64, "branch": branch}
+        if sha:
+            payload["sha"] = sha
+        return self._request(
+            "PUT",
+            f"{GITHUB_API_URL}/repos/{self.repo_name}/contents/{path}",
+            json=payload,
+            timeout=60
+        )
+
+    def _upload_files_rest(self, branch: str, encoded: Dict[str, str]):
+        """Upload base64-encoded files over REST (fallback when GraphQL is unavailable)"""
+        for path, b64 in encoded.items():
+            try:
+                # Most patched files are new: try a plain create first (1 RTT)
+                response = self._put_file(path, b64, f"[AutoCTF] Add {path}", branch)
+                action = "Created"
+                if response.status_code == 422:
+                    # File exists - GitHub wants its SHA, so look it up and update instead
+                    sha = self._probe_sha(path, branch)
+                    response = self._put_file(path, b64, f"[AutoCTF] Patch {path}", branch, sha=sha)
+                    action = "Updated"
+            except self._transport_errors as e:
+                logger.error(f"  ❌ Failed to upload {path}: {e}")
+                raise GitHubClientError(f"File upload failed for {path}")
+
+            if response.status_code not in (200, 201):
+                message = response.json().get("message", response.status_code) if response.content else response.status_code
+                logger.error(f"  ❌ Failed to upload {path}: {message}")
+                raise GitHubClientError(f"File upload failed for {path}")
+            logger.info(f"  ✅ {action}: {path}")
 
     def get_repo(self):
         """Get repository object"""
         if not self.g:
             raise GitHubClientError("GitHub client not initialized")
 
-        try:
-            return self.g.get_repo(self.repo_name)
-        except GithubException as e:
-            raise GitHubClientError(f"Failed to access repository: {e.data.get('message', str(e))}")
+        if self._repo is None:
+            from github import GithubException
+            try:
+                self._repo = self.g.get_repo(self.repo_name)
+            except GithubException as e:
+                raise GitHubClientError(f"Failed to access repository: {e.data.get('message', str(e))}")
+        return self._repo
+
+    def _get_base_branch(self):
+        """Get the repository's default branch, returning (head commit SHA, name)"""
+        owner, name = self.repo_name.split("/", 1)
+        data = self._graphql(_DEFAULT_BRANCH_QUERY, {"owner": owner, "name": name})
+        ref = data["repository"]["defaultBranchRef"]
+        if not ref:
+            raise GitHubClientError(f"Repository has no default branch: {self.repo_name}")
+        return ref["target"]["oid"], ref["name"]
 
     def create_pr(
         self,
         title: str,
         body: str,
         branch: str,
-        files: Dict[str, str],
+        files: Dict[str, Union[str, bytes]],
         screenshots: list = None,
         dump_data: dict = None
     ) -> str:
@@ -144,7 +571,7 @@ class GitHubClient:
             title: PR title
             body: PR description
             branch: Branch name for PR
-            files: Dict of file paths to content
+            files: Dict of file paths to content (str, or bytes for binary files)
             screenshots: List of screenshot URLs (optional)
             dump_data: Database dump data (optional)
 
@@ -157,6 +584,7 @@ class GitHubClient:
         if not self.g:
             raise GitHubClientError("GitHub client not initialized")
 
+        from github import GithubException
         try:
             repo = self.get_repo()
 
@@ -165,19 +593,14 @@ class GitHubClient:
 
             logger.info(f"📝 Creating PR: {title}")
 
-            # Get base branch
-            try:
-                base = repo.get_branch("master")
-                base_name = "master"
-            except:
-                base = repo.get_branch("main")
-                base_name = "main"
+            # Get base branch (the default branch and its head in one query)
+            base_sha, base_name = self._get_base_branch()
 
             logger.info(f"🌿 Base branch: {base_name}")
 
             # Create new branch
             try:
-                repo.create_git_ref(ref=f"refs/heads/{branch}", sha=base.commit.sha)
+                repo.create_git_ref(ref=f"refs/heads/{branch}", sha=base_sha)
                 logger.info(f"✅ Created branch: {branch}")
             except GithubException as e:
                 if e.status == 422:  # Branch already exists
@@ -185,37 +608,15 @@ class GitHubClient:
                 else:
                     raise GitHubClientError(f"Failed to create branch: {e.data.get('message', str(e))}")
 
-            # Upload files
+            # Upload files - one commit for all files via GraphQL, REST per-file as fallback
             logger.info(f"📤 Uploading {len(files)} file(s)...")
-            for path, content in files.items():
-                try:
-                    # Check if file exists
-                    try:
-                        f = repo.get_contents(path, ref=base_name)
-                        # Update existing file
-                        repo.update_file(
-                            path,
-                            f"[AutoCTF] Patch {path}",
-                            content,
-                            f.sha,
-                            branch=branch
-                        )
-                        logger.info(f"  ✅ Updated: {path}")
-                    except GithubException as e:
-                        if e.status == 404:
-                            # Create new file
-                            repo.create_file(
-                                path,
-                                f"[AutoCTF] Add {path}",
-                                content,
-                                branch=branch
-                            )
-                            logger.info(f"  ✅ Created: {path}")
-                        else:
-                            raise
-                except GithubException as e:
-                    logger.error(f"  ❌ Failed to upload {path}: {e.data.get('message', str(e))}")
-                    raise GitHubClientError(f"File upload failed for {path}")
+            encoded = {path: _b64(content) for path, content in files.items()}  # encode each file once
+            try:
+                oid = self._commit_files_graphql(branch, encoded, title)
+                logger.info(f"  ✅ Committed {len(files)} file(s) in {oid[:7]}")
+            except (GitHubClientError, *self._transport_errors) as e:
+                logger.warning(f"⚠️  GraphQL commit failed ({e}), falling back to REST uploads")
+                self._upload_files_rest(branch, encoded)
 
             # Create pull request
             logger.info("📬 Creating pull request...")
@@ -251,6 +652,20 @@ class GitHubClient:
             logger.error(f"❌ Unexpected error creating PR: {e}")
             raise GitHubClientError(f"Unexpected error: {str(e)}")
 
+    async def create_pr_async(
+        self,
+        title: str,
+        body: str,
+        branch: str,
+        files: Dict[str, Union[str, bytes]],
+        screenshots: list = None,
+        dump_data: dict = None
+    ) -> str:
+        """Create a pull request without blocking the event loop (see create_pr)"""
+        return await asyncio.to_thread(
+            self.create_pr, title, body, branch, files, screenshots, dump_data
+        )
+
     def _generate_enhanced_pr_body(
         self,
         original_body: str,
@@ -258,7 +673,15 @@ class GitHubClient:
         dump_data: dict
     ) -> str:
         """Generate enhanced PR body with exploitation evidence"""
-        body_parts = [
+        buf = io.StringIO()
+
+        def section(*lines):
+            """Write lines, each newline-terminated"""
+            for line in lines:
+                buf.write(line)
+                buf.write("\n")
+
+        section(
             "# 🎯 AutoCTF Security Patch",
             "",
             original_body,
@@ -267,31 +690,27 @@ class GitHubClient:
             "",
             "## 🔥 EXPLOITATION EVIDENCE",
             ""
-        ]
+        )
 
         # Add dump summary if available
         if dump_data and dump_data.get('summary'):
-            body_parts.extend([
+            section(
                 "### 💀 SQLi Exploitation Summary",
                 "```",
                 dump_data['summary'],
                 "```",
                 ""
-            ])
+            )
 
         # Add database enumeration
         if dump_data and dump_data.get('databases'):
-            body_parts.extend([
-                "### 💾 Databases Compromised",
-                ""
-            ])
-            for db in dump_data['databases']:
-                body_parts.append(f"- ✅ `{db}` - **DUMPED**")
-            body_parts.append("")
+            section("### 💾 Databases Compromised", "")
+            section(*(f"- ✅ `{db}` - **DUMPED**" for db in dump_data['databases']))
+            section("")
 
         # Add credentials if found
         if dump_data and dump_data.get('credentials'):
-            body_parts.extend([
+            section(
                 "### 🔑 Credentials Extracted",
                 "",
                 f"⚠️ **{len(dump_data['credentials'])} credential entries found**",
@@ -300,33 +719,28 @@ class GitHubClient:
                 "<summary>View Extracted Credentials (Click to expand)</summary>",
                 "",
                 "```"
-            ])
-            for cred in dump_data['credentials'][:5]:  # Limit to first 5
-                body_parts.append(cred)
-                body_parts.append("---")
-            body_parts.extend([
-                "```",
-                "</details>",
-                ""
-            ])
+            )
+            for cred in itertools.islice(dump_data['credentials'], 5):  # Limit to first 5
+                section(cred, "---")
+            section("```", "</details>", "")
 
         # Add screenshots
         if screenshots:
-            body_parts.extend([
+            section(
                 "### 📸 Proof of Exploitation",
                 "",
                 "*Screenshots captured during exploitation:*",
                 ""
-            ])
-            for i, screenshot_url in enumerate(screenshots, 1):
-                if screenshot_url and screenshot_url.startswith("http"):
-                    body_parts.append(f"![Exploitation Screenshot {i}]({screenshot_url})")
-                else:
-                    body_parts.append(f"- Screenshot {i}: `{screenshot_url}`")
-            body_parts.append("")
+            )
+            section(*(
+                f"![Exploitation Screenshot {i}]({url})" if url and url.startswith("http")
+                else f"- Screenshot {i}: `{url}`"
+                for i, url in enumerate(screenshots, 1)
+            ))
+            section("")
 
         # Add remediation info
-        body_parts.extend([
+        section(
             "---",
             "",
             "## 🛡️ REMEDIATION",
@@ -340,12 +754,10 @@ class GitHubClient:
             "",
             "---",
             "",
-            "🤖 **Generated by AutoCTF** - Autonomous Pentesting Agent",
-            ""
-        ])
-
-        return "\n".join(body_parts)
+            "🤖 **Generated by AutoCTF** - Autonomous Pentesting Agent"
+        )
 
+        return buf.getvalue()
 
 # Global client instance
 _client = None
@@ -358,6 +770,15 @@ def get_client() -> GitHubClient:
     return _client
 
 
+def _close_client():
+    """Flush the global client's ETag cache and pools at exit (other instances use `with`)"""
+    if _client is not None:
+        _client.close()
+
+
+atexit.register(_close_client)
+
+
 # Backward compatibility functions
 def get_repo():
     """Get repository object (backward compatibility)"""
@@ -378,16 +799,15 @@ def create_pr(
     return client.create_pr(title, body, branch, files, screenshots, dump_data)
 
 
-# Validation on import - fail fast if misconfigured
-try:
-    # Only validate if being imported for actual use (not during diagnostic)
-    import sys
-    if 'diagnose' not in ' '.join(sys.argv).lower():
-        _client = GitHubClient()
-        logger.info("✅ GitHub client initialized successfully")
-except GitHubClientError as e:
-    logger.error(f"❌ GitHub client initialization failed: {e}")
-    logger.error("   Fix GitHub configuration before running pentests")
-    # Don't raise - allow import but fail later with clear error
-except Exception as e:
-    logger.warning(f"⚠️  GitHub client pre-validation skipped: {e}")
+async def acreate_pr(
+    title: str,
+    body: str,
+    branch: str,
+    files: dict,
+    screenshots: list = None,
+    dump_data: dict = None
+) -> str:
+    """Create PR without blocking the event loop"""
+    client = await asyncio.to_thread(get_client)  # first call validates tokens over the network
+    return await client.create_pr_async(title, body, branch, files, screenshots, dump_data)
+
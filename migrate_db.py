@@ -10,7 +10,7 @@ import os
 # Add dashboard backend to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'dashboard', 'backend'))
 
-from sqlalchemy import text
+from sqlalchemy import inspect, text
 from database import engine, SessionLocal
 
 def run_migration():
@@ -19,38 +19,30 @@ def run_migration():
     print("🔄 Running AutoCTF database migration...")
     print("Adding fields: dump_data, cvss_score, title, proof")
 
-    migrations = [
-        # Add dump_data column (JSON)
-        """
-        ALTER TABLE vulnerabilities
-        ADD COLUMN IF NOT EXISTS dump_data JSON;
-        """,
-
-        # Add cvss_score column
-        """
-        ALTER TABLE vulnerabilities
-        ADD COLUMN IF NOT EXISTS cvss_score VARCHAR(10);
-        """,
-
-        # Add title column
-        """
-        ALTER TABLE vulnerabilities
-        ADD COLUMN IF NOT EXISTS title VARCHAR(255);
-        """,
-
-        # Add proof column
-        """
-        ALTER TABLE vulnerabilities
-        ADD COLUMN IF NOT EXISTS proof TEXT;
-        """,
-    ]
+    # Column name -> PostgreSQL type
+    columns = {
+        "dump_data": "JSON",            # DB dump results
+        "cvss_score": "VARCHAR(10)",    # CVSS vulnerability score
+        "title": "VARCHAR(255)",        # Vulnerability title
+        "proof": "TEXT",                # Proof of exploitation
+    }
 
     try:
-        with engine.connect() as conn:
-            for i, migration in enumerate(migrations, 1):
-                print(f"  [{i}/{len(migrations)}] Applying migration...")
-                conn.execute(text(migration))
-                conn.commit()
+        with engine.begin() as conn:
+            # One catalog read decides what's missing - re-runs issue no DDL at all
+            existing = {col["name"] for col in inspect(conn).get_columns("vulnerabilities")}
+            missing = {name: col_type for name, col_type in columns.items() if name not in existing}
+            if not missing:
+                print("✅ Database already migrated - nothing to do")
+                return True
+
+            # One multi-clause ALTER: a single round-trip and schema lock for all columns
+            clauses = [f"ADD COLUMN IF NOT EXISTS {name} {col_type}" for name, col_type in missing.items()]
+            migration = "ALTER TABLE vulnerabilities\n    " + ",\n    ".join(clauses) + ";"
+
+            for i, clause in enumerate(clauses, 1):
+                print(f"  [{i}/{len(clauses)}] {clause}")
+            conn.execute(text(migration))
 
         print("✅ Migration completed successfully!")
         print("\nNew vulnerability table schema:")
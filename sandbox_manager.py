@@ -5,13 +5,114 @@ Manages remote E2B sandboxes for security testing without Docker
 
 from e2b import AsyncSandbox
 import asyncio
+import atexit
+import json
+import logging
+import logging.handlers
 import os
-from dotenv import load_dotenv
-from typing import Optional, Dict, Any
+import queue
+import sys
+from config import ENV
+from loop_runner import run_coroutine
+from pathlib import Path
+from typing import Optional, Dict, Any, List, AsyncIterator
+import re
+import socket
 import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows - the ID file still works, just without cross-process locking
+    fcntl = None
+
+# Per-command diagnostics (DEBUG unless AUTOCTF_VERBOSE=1). Records are formatted only when
+# enabled and written by a listener thread, so the event loop never blocks on stdout.
+log = logging.getLogger("autoctf.sandbox")
+if not log.handlers:
+    _log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler(sys.stdout))
+    log.addHandler(logging.handlers.QueueHandler(_log_queue))
+    log.setLevel(logging.DEBUG if ENV.get("AUTOCTF_VERBOSE", "0") == "1" else logging.INFO)
+    log.propagate = False
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
+# Custom E2B template with the security tools pre-installed (see e2b.Dockerfile)
+E2B_TEMPLATE = ENV.get("E2B_TEMPLATE", "autoctf-sec-tools")
+
+# Sandbox lifetime on the E2B side; the heartbeat extends it while the sandbox is in use
+SANDBOX_TIMEOUT = 900
+HEARTBEAT_INTERVAL = 300
+
+# Live sandbox IDs, so a restarted process reconnects instead of cold-booting. Shared by every
+# process on the host: each entry records its owner, and only orphaned entries are reused
+_SANDBOX_CACHE_PATH = Path(ENV.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'autoctf' / 'sandboxes.json'
+_HOST = socket.gethostname()
+
+# Separates the apt output from the tool check in the combined install script
+VERIFY_SENTINEL = "---VERIFY---"
+
+# Binaries checked after install; exit 127 from anything else (e.g. a typo) never triggers a reinstall
+VERIFIED_TOOLS = ("nmap", "nikto", "gobuster", "sqlmap", "curl", "wget", "git")
+KNOWN_TOOLS = frozenset(VERIFIED_TOOLS + ("whois", "dig", "nslookup", "host", "nc"))
+
+# A tool missing within this many seconds of an install won't be fixed by reinstalling
+REINSTALL_COOLDOWN = 300
+
+
+class _SandboxCacheLock:
+    """Exclusive advisory lock on the sandbox ID file (no-op without fcntl)"""
+
+    def __enter__(self):
+        _SANDBOX_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(f"{_SANDBOX_CACHE_PATH}.lock", 'w')
+        if fcntl:
+            fcntl.flock(self._fh, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self._fh, fcntl.LOCK_UN)
+        self._fh.close()
+
+
+def _read_sandbox_cache() -> Dict[str, dict]:
+    """Read {sandbox_id: {created_at, host, pid}} (call with _SandboxCacheLock held)"""
+    try:
+        entries = json.loads(_SANDBOX_CACHE_PATH.read_text())
+    except (OSError, ValueError):
+        return {}
+    # Entries from older versions ({id: created_at}) have no owner and are dropped
+    return {sid: entry for sid, entry in entries.items() if isinstance(entry, dict)}
+
+
+def _write_sandbox_cache(entries: Dict[str, dict]):
+    """Atomically replace the sandbox ID file (call with _SandboxCacheLock held)"""
+    tmp_path = _SANDBOX_CACHE_PATH.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps(entries))
+    os.replace(tmp_path, _SANDBOX_CACHE_PATH)
+
+
+def _owned_by_me(entry: dict) -> bool:
+    return entry.get('host') == _HOST and entry.get('pid') == os.getpid()
+
+
+def _is_orphan(entry: dict) -> bool:
+    """True when the process that saved an entry is gone (or released it), so it can be reused"""
+    pid = entry.get('pid')
+    if pid is None:
+        return True
+    if entry.get('host') != _HOST or os.name != 'posix':
+        return False  # can't check the owner; the entry ages out instead
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass  # exists but belongs to another user
+    return False
 
-# Load environment variables
-load_dotenv()
 
 class SandboxManager:
     """
@@ -21,21 +122,80 @@ class SandboxManager:
 
     def __init__(self):
         self.sandbox: Optional[AsyncSandbox] = None
-        self.api_key = os.getenv('E2B_API_KEY')
+        self.api_key = ENV.get('E2B_API_KEY')
         self.created_at = None
         self.command_count = 0
         self.max_sandbox_age = 3600  # 1 hour
         self.max_commands = 100  # Reset after 100 commands
 
+        # Warm pool: idle sandboxes wait in a queue; spares boot in the background.
+        # Every pooled sandbox is billed, so more than one is opt-in (E2B_POOL_SIZE) -
+        # concurrent commands share a busy sandbox instead of waiting for an idle one
+        self.pool_size = max(1, int(ENV.get('E2B_POOL_SIZE', '1')))
+        self._closed = False  # set by close_sandbox(); stops refills until the next acquire()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None  # loop the pool belongs to
+        self._pool: Optional[asyncio.Queue] = None  # created by _bind_loop()
+        self._changed: Optional[asyncio.Event] = None  # set (and replaced) whenever the pool changes
+        self._stats: Dict[str, Dict[str, float]] = {}  # sandbox_id -> created_at, commands
+        self._in_use: Dict[AsyncSandbox, int] = {}  # checked-out sandbox -> callers sharing it
+        self._live = 0  # pooled + checked out + booting
+        self._tasks: set = set()
+        self._created_ids: set = set()  # sandboxes this process booted - the only ones it kills
+        self._released: Dict[str, float] = {}  # reconnected sandboxes handed back unowned on save
+        self._saved = self._claim_saved_ids()  # reconnect candidates from a previous run
+        self._tools_installed_at: Dict[str, float] = {}  # sandbox_id -> last install_security_tools()
+        self._installed_tools: Dict[str, set] = {}  # sandbox_id -> tools verified present
+
         if not self.api_key:
             raise ValueError("E2B_API_KEY not found in environment variables. Add it to your .env file.")
 
-    async def create_sandbox(self, template: str = "base", timeout: int = 900) -> AsyncSandbox:
+    def _claim_saved_ids(self) -> Dict[str, float]:
+        """
+        Take over the orphaned sandbox IDs in the shared file, returning {sandbox_id: created_at}
+
+        Entries of processes that are still running are left alone; claimed entries are
+        re-saved under this process so no other process reconnects to them too.
+        """
+        now = time.time()
+        claimed = {}
+        try:
+            with _SandboxCacheLock():
+                entries = _read_sandbox_cache()
+                for sid, entry in list(entries.items()):
+                    created_at = float(entry.get('created_at', 0))
+                    if now - created_at >= self.max_sandbox_age:
+                        del entries[sid]
+                    elif _is_orphan(entry):
+                        claimed[sid] = created_at
+                        entries[sid] = {'created_at': created_at, 'host': _HOST, 'pid': os.getpid()}
+                _write_sandbox_cache(entries)
+        except OSError as e:
+            log.warning("⚠️  Could not read saved sandbox IDs: %s", e)
+        return claimed
+
+    def _save_ids(self):
+        """Merge the IDs of the sandboxes this manager owns into the shared file"""
+        mine = {sid: st['created_at'] for sid, st in self._stats.items()}
+        mine.update(self._saved)
+        try:
+            with _SandboxCacheLock():
+                entries = {sid: entry for sid, entry in _read_sandbox_cache().items()
+                           if not _owned_by_me(entry)}
+                for sid, created_at in mine.items():
+                    entries[sid] = {'created_at': created_at, 'host': _HOST, 'pid': os.getpid()}
+                for sid, created_at in self._released.items():
+                    entries[sid] = {'created_at': created_at, 'host': _HOST, 'pid': None}
+                _write_sandbox_cache(entries)
+            self._released.clear()
+        except OSError as e:
+            log.warning("⚠️  Could not save sandbox IDs: %s", e)
+
+    async def create_sandbox(self, template: Optional[str] = None, timeout: int = SANDBOX_TIMEOUT) -> AsyncSandbox:
         """
         Create a new E2B sandbox instance
 
         Args:
-            template: E2B template to use (default: "base")
+            template: E2B template to use (default: E2B_TEMPLATE, falling back to the base image)
             timeout: Sandbox timeout in seconds (default: 900 = 15 min)
 
         Returns:
@@ -45,86 +205,255 @@ class SandboxManager:
             RuntimeError: If sandbox creation fails
         """
         try:
-            print(f"🚀 Creating E2B sandbox (timeout: {timeout}s)...")
+            log.info("🚀 Creating E2B sandbox (timeout: %ss)...", timeout)
 
-            # Create sandbox with API key
-            self.sandbox = await AsyncSandbox.create(
-                timeout=timeout,
-                api_key=self.api_key
-            )
+            # Create sandbox with API key, preferring the template with tools baked in
+            template = template or E2B_TEMPLATE
+            try:
+                self.sandbox = await AsyncSandbox.create(
+                    template=template,
+                    timeout=timeout,
+                    api_key=self.api_key
+                )
+            except Exception as e:
+                log.warning("⚠️  Template '%s' unavailable (%s), using base image", template, e)
+                self.sandbox = await AsyncSandbox.create(
+                    timeout=timeout,
+                    api_key=self.api_key
+                )
 
             self.created_at = time.time()
             self.command_count = 0
 
-            print(f"✅ E2B Sandbox created: {self.sandbox.sandbox_id[:12]}...")
+            log.info("✅ E2B Sandbox created: %s...", self.sandbox.sandbox_id[:12])
             return self.sandbox
 
         except Exception as e:
             error_msg = f"Failed to create E2B sandbox: {str(e)}"
-            print(f"❌ {error_msg}")
+            log.error("❌ %s", error_msg)
 
             # Check for common errors
             if "api_key" in str(e).lower() or "unauthorized" in str(e).lower():
-                print("💡 Hint: Check your E2B_API_KEY in .env file")
-                print("   Get API key from: https://e2b.dev/dashboard")
+                log.info("💡 Hint: Check your E2B_API_KEY in .env file")
+                log.info("   Get API key from: https://e2b.dev/dashboard")
             elif "quota" in str(e).lower() or "limit" in str(e).lower():
-                print("💡 Hint: You may have hit E2B quota limits")
-                print("   Check your usage: https://e2b.dev/dashboard")
+                log.info("💡 Hint: You may have hit E2B quota limits")
+                log.info("   Check your usage: https://e2b.dev/dashboard")
             elif "timeout" in str(e).lower():
-                print("💡 Hint: Sandbox creation timed out - E2B may be experiencing issues")
+                log.info("💡 Hint: Sandbox creation timed out - E2B may be experiencing issues")
 
             raise RuntimeError(error_msg) from e
 
-    async def get_or_create_sandbox(self) -> AsyncSandbox:
-        """
-        Get existing sandbox or create new one if needed
-        Handles automatic recreation on expiration or quota limits
-        """
-        # Check if sandbox needs recreation
-        should_recreate = False
+    def _expired(self, sandbox: AsyncSandbox) -> bool:
+        """Check whether a sandbox is past its age or command budget"""
+        stats = self._stats.get(sandbox.sandbox_id)
+        if stats is None:
+            return True
+        now = time.time()
+        return (now - stats['created_at'] > self.max_sandbox_age
+                or stats['commands'] >= self.max_commands
+                or now - stats['heartbeat'] > SANDBOX_TIMEOUT - 60)  # E2B is about to reclaim it
+
+    def _track(self, coro):
+        """Run a background task, keeping a reference until it finishes"""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _reconnect(self, sandbox_id: str) -> Optional[AsyncSandbox]:
+        """Reconnect to a sandbox from a previous run and refresh its timeout"""
+        try:
+            sandbox = await AsyncSandbox.connect(sandbox_id, api_key=self.api_key)
+            await sandbox.set_timeout(SANDBOX_TIMEOUT)
+            log.info("🔌 Reconnected to sandbox: %s...", sandbox_id[:12])
+            return sandbox
+        except Exception as e:
+            log.warning("⚠️  Saved sandbox %s unavailable (%s), creating a new one", sandbox_id[:12], e)
+            return None
 
-        if self.sandbox is None:
-            should_recreate = True
-            print("📦 No sandbox exists, creating new one...")
+    async def _spawn(self, saved_id: Optional[str] = None, created_at: Optional[float] = None):
+        """Boot (or reconnect) one sandbox with tools and add it to the pool"""
+        try:
+            sandbox = await self._reconnect(saved_id) if saved_id else None
+            if sandbox is None:
+                sandbox, created_at = await self.create_sandbox(), None
+                self._created_ids.add(sandbox.sandbox_id)
+            await self.install_security_tools(sandbox)
+        except Exception as e:
+            # Hand the failure to whoever is waiting on the pool
+            self._live -= 1
+            self._pool.put_nowait(e)
+            self._notify()
+            return
+        if self._closed:
+            # The pool was shut down while this sandbox booted
+            self._live -= 1
+            if sandbox.sandbox_id in self._created_ids:
+                await self._kill(sandbox)
+            else:
+                self._released[sandbox.sandbox_id] = created_at
+                self._save_ids()
+            return
+        now = time.time()
+        self._stats[sandbox.sandbox_id] = {'created_at': created_at or now, 'commands': 0, 'heartbeat': now}
+        self._save_ids()
+        self._pool.put_nowait(sandbox)
+        self._notify()
+
+    def _notify(self):
+        """Wake every acquire() waiting for a sandbox"""
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _refill(self):
+        """Top the pool back up to pool_size in the background, reusing saved sandboxes first"""
+        while not self._closed and self._live < self.pool_size:
+            self._live += 1
+            if self._saved:
+                self._track(self._spawn(*self._saved.popitem()))
+            else:
+                self._track(self._spawn())
 
-        elif self.created_at and (time.time() - self.created_at > self.max_sandbox_age):
-            should_recreate = True
-            print("♻️  Sandbox expired (>1 hour), recreating...")
+    async def _heartbeat(self, sandbox: AsyncSandbox):
+        """Extend a sandbox's E2B timeout if it hasn't been refreshed recently"""
+        stats = self._stats[sandbox.sandbox_id]
+        if time.time() - stats['heartbeat'] < HEARTBEAT_INTERVAL:
+            return
+        try:
+            await sandbox.set_timeout(SANDBOX_TIMEOUT)
+            stats['heartbeat'] = time.time()
+        except Exception as e:
+            log.warning("⚠️  Sandbox heartbeat failed: %s", e)
+
+    def _discard(self, sandbox: AsyncSandbox):
+        """Drop a sandbox from the pool and kill it in the background (if this process created it)"""
+        self._live -= 1
+        self._stats.pop(sandbox.sandbox_id, None)
+        self._tools_installed_at.pop(sandbox.sandbox_id, None)
+        self._installed_tools.pop(sandbox.sandbox_id, None)
+        self._save_ids()
+        if sandbox.sandbox_id in self._created_ids:
+            self._track(self._kill(sandbox))
+
+    async def _kill(self, sandbox: AsyncSandbox):
+        """Kill a sandbox, ignoring errors (E2B reclaims it on timeout anyway)"""
+        self._created_ids.discard(sandbox.sandbox_id)
+        try:
+            await sandbox.kill()
+        except Exception:
+            pass
 
-        elif self.command_count >= self.max_commands:
-            should_recreate = True
-            print("♻️  Command limit reached, recreating sandbox...")
+    def _bind_loop(self):
+        """
+        Create the pool queue for the running event loop
 
-        if should_recreate:
-            await self.close_sandbox()
-            await self.create_sandbox()
-            await self.install_security_tools()
+        asyncio.Queue (on 3.10) and the sandboxes' API clients belong to the loop that
+        first used them, and the global manager outlives each asyncio.run(). Under a new
+        loop the old pool is dropped and its sandboxes are reconnected by ID instead.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        if self._pool is not None:
+            sandboxes = list(self._in_use)
+            while not self._pool.empty():
+                sandboxes.append(self._pool.get_nowait())
+            for sandbox in sandboxes:
+                stats = None if isinstance(sandbox, Exception) else self._stats.get(sandbox.sandbox_id)
+                if stats:
+                    self._saved[sandbox.sandbox_id] = stats['created_at']
+        self._stats.clear()
+        self._in_use.clear()
+        self._tasks.clear()
+        self._live = 0
+        self._loop = loop
+        self._pool = asyncio.Queue()
+        self._changed = asyncio.Event()
+
+    def _least_busy(self) -> Optional[AsyncSandbox]:
+        """The checked-out sandbox with the fewest callers that can still take commands"""
+        return min((sandbox for sandbox in self._in_use if not self._expired(sandbox)),
+                   key=self._in_use.get, default=None)
+
+    async def acquire(self) -> AsyncSandbox:
+        """
+        Check a sandbox out of the pool
+
+        An idle sandbox is preferred; when none is ready, the least busy sandbox that is
+        already checked out is shared (E2B runs concurrent commands in one sandbox), so
+        parallel commands only wait for a boot when there is no sandbox at all.
+        Expired sandboxes are recycled and the pool is refilled in the background.
+        Reopens the pool after close_sandbox().
+        """
+        self._bind_loop()
+        if self._closed:
+            self._closed = False
+            self._saved = self._claim_saved_ids()
+        waiting = False
+        while True:
+            self._refill()
+            if self._pool.empty():
+                sandbox = self._least_busy()
+                if sandbox is not None:
+                    break
+                if not waiting:
+                    log.info("📦 No ready sandbox in the pool, waiting for one to boot...")
+                    waiting = True
+                await self._changed.wait()
+                continue
+            sandbox = self._pool.get_nowait()
+            if isinstance(sandbox, Exception):
+                raise RuntimeError(f"Failed to create E2B sandbox: {sandbox}") from sandbox
+            if not self._expired(sandbox):
+                break
+            log.info("♻️  Sandbox expired (>1 hour or command limit), recycling...")
+            self._discard(sandbox)
+
+        self._in_use[sandbox] = self._in_use.get(sandbox, 0) + 1
+        self._notify()  # other waiters can share it now
+        await self._heartbeat(sandbox)
+        self.sandbox = sandbox
+        self.created_at = self._stats[sandbox.sandbox_id]['created_at']
+        self.command_count = int(self._stats[sandbox.sandbox_id]['commands'])
+        return sandbox
+
+    def release(self, sandbox: AsyncSandbox):
+        """Return a sandbox to the pool once its last caller is done, recycling it if it has expired"""
+        users = self._in_use.get(sandbox)
+        if users is None:
+            return  # checked out under a previous event loop; reconnected by ID instead
+        if users > 1:
+            self._in_use[sandbox] = users - 1
+            return
+        del self._in_use[sandbox]
+        if self._expired(sandbox):
+            self._discard(sandbox)
+            self._refill()
+        else:
+            self._pool.put_nowait(sandbox)
+            self._notify()
 
-        return self.sandbox
+    async def get_or_create_sandbox(self) -> AsyncSandbox:
+        """
+        Get a ready sandbox from the pool (backward compatibility)
+        Handles automatic recreation on expiration or quota limits
+        """
+        sandbox = await self.acquire()
+        self.release(sandbox)
+        return sandbox
 
-    async def install_security_tools(self):
+    async def install_security_tools(self, sandbox: Optional[AsyncSandbox] = None):
         """
         Install required security tools in the sandbox
         Handles apt-get installation with proper error handling
         """
-        if not self.sandbox:
+        sandbox = sandbox or self.sandbox
+        if not sandbox:
             raise RuntimeError("No sandbox available for tool installation")
 
-        print("📦 Installing security tools (this may take 2-3 minutes)...")
+        log.info("📦 Installing security tools (this may take 2-3 minutes)...")
 
         try:
-            # Update package lists with timeout and error handling
-            print("  → Updating package lists...")
-            update_cmd = """
-            export DEBIAN_FRONTEND=noninteractive && \
-            sudo apt-get update -qq 2>&1 | grep -E "Reading|Fetched|E:|W:" | tail -5
-            """
-
-            update_result = await self.sandbox.commands.run(update_cmd, timeout=120)
-
-            if update_result.exit_code != 0:
-                print(f"⚠️  Update warning (exit {update_result.exit_code}), continuing anyway...")
-
             # Install security tools
             tools = [
                 "nmap",          # Network scanner
@@ -139,24 +468,28 @@ class SandboxManager:
                 "netcat-openbsd" # Network utility
             ]
 
-            install_cmd = f"""
-            export DEBIAN_FRONTEND=noninteractive && \
-            sudo apt-get install -y -qq {' '.join(tools)} 2>&1 | \
-            grep -E "Setting up|Unpacking|Done|E:|W:" | tail -10
-            """
-
-            print(f"  → Installing: {', '.join(tools)}")
-            result = await self.sandbox.commands.run(install_cmd, timeout=300)
-
-            if result.exit_code != 0:
-                print(f"⚠️  Some tools may not have installed (exit {result.exit_code})")
-                if result.stderr:
-                    print(f"  → Error: {result.stderr[:200]}")
-
-            # Verify installation
-            verify_cmd = """
-            echo "Checking installed tools:" && \
-            for tool in nmap nikto gobuster sqlmap curl wget git; do
+            # Update, install and verify in one script - a single E2B round-trip.
+            # apt is skipped entirely when the template already provides the tools.
+            script = f"""
+            set +e
+            missing=0
+            for tool in {' '.join(VERIFIED_TOOLS)}; do
+                command -v $tool >/dev/null 2>&1 || missing=1
+            done
+            if [ $missing = 1 ]; then
+                export DEBIAN_FRONTEND=noninteractive
+                # Package indexes refreshed within the last hour are reused as-is
+                if [ -z "$(find /var/lib/apt/lists -maxdepth 1 -name '*Packages*' -mmin -60 2>/dev/null)" ]; then
+                    sudo apt-get update -qq 2>&1 | grep -E "Reading|Fetched|E:|W:" | tail -5
+                else
+                    echo "Package lists are fresh, skipping apt-get update"
+                fi
+                sudo apt-get install -y -qq --no-install-recommends {' '.join(tools)} 2>&1 | \
+                    grep -E "Setting up|Unpacking|Done|E:|W:" | tail -10
+            fi
+            echo "{VERIFY_SENTINEL}"
+            echo "Checking installed tools:"
+            for tool in {' '.join(VERIFIED_TOOLS)}; do
                 if command -v $tool >/dev/null 2>&1; then
                     echo "  ✓ $tool"
                 else
@@ -165,29 +498,44 @@ class SandboxManager:
             done
             """
 
-            verify_result = await self.sandbox.commands.run(verify_cmd, timeout=30)
-            print(verify_result.stdout)
+            log.info("  → Updating package lists and installing: %s", ', '.join(tools))
+            result = await sandbox.commands.run(script, timeout=420)
+
+            install_log, _, verify_output = (result.stdout or "").partition(VERIFY_SENTINEL)
+            if "E:" in install_log:
+                log.warning("⚠️  Some tools may not have installed:\n%s", install_log.strip()[-500:])
+            log.info("%s", verify_output.strip())
+            self._tools_installed_at[sandbox.sandbox_id] = time.time()
+            self._installed_tools[sandbox.sandbox_id] = {
+                tool for tool in VERIFIED_TOOLS if f"✓ {tool}" in verify_output
+            }
 
             # Check if critical tools are available
             critical_tools = ["nmap", "sqlmap", "curl"]
             missing_critical = []
 
             for tool in critical_tools:
-                if f"✗ {tool}" in verify_result.stdout or f"✗ {tool}" in str(verify_result.stderr):
+                if f"✗ {tool}" in verify_output:
                     missing_critical.append(tool)
 
             if missing_critical:
-                print(f"❌ Critical tools missing: {', '.join(missing_critical)}")
-                print("⚠️  Pentest scans may fail or produce limited results")
+                log.error("❌ Critical tools missing: %s", ', '.join(missing_critical))
+                log.warning("⚠️  Pentest scans may fail or produce limited results")
             else:
-                print("✅ Security tools installed and verified")
+                log.info("✅ Security tools installed and verified")
 
         except asyncio.TimeoutError:
-            print("❌ Tool installation timed out (network issues?)")
-            print("⚠️  Continuing anyway, but scans will likely fail")
+            log.error("❌ Tool installation timed out (network issues?)")
+            log.warning("⚠️  Continuing anyway, but scans will likely fail")
         except Exception as e:
-            print(f"❌ Tool installation error: {str(e)}")
-            print("⚠️  Continuing anyway, but scans will likely fail")
+            log.error("❌ Tool installation error: %s", e)
+            log.warning("⚠️  Continuing anyway, but scans will likely fail")
+
+    def _should_reinstall(self, sandbox: AsyncSandbox, tool: str) -> bool:
+        """Whether exit 127 for `tool` is worth a tool reinstall in this sandbox"""
+        if tool not in KNOWN_TOOLS or tool in self._installed_tools.get(sandbox.sandbox_id, ()):
+            return False
+        return time.time() - self._tools_installed_at.get(sandbox.sandbox_id, 0) > REINSTALL_COOLDOWN
 
     async def run_command(self, command: str, timeout: int = 120) -> Dict[str, Any]:
         """
@@ -198,43 +546,47 @@ class SandboxManager:
             timeout: Command timeout in seconds
 
         Returns:
-            Dict with stdout, stderr, exit_code, and success status
+            Dict with stdout, stderr, output (stdout + stderr), exit_code, and success status
 
         Raises:
             RuntimeError: If sandbox is unavailable or command fails critically
         """
         try:
-            # Ensure sandbox exists
-            sandbox = await self.get_or_create_sandbox()
-
-            self.command_count += 1
-            print(f"[Sandbox] Running command #{self.command_count}: {command[:80]}...")
-
-            # Run command with timeout
-            result = await sandbox.commands.run(command, timeout=timeout)
-
-            # Handle command not found errors
-            if result.exit_code == 127:
-                tool = command.split()[0]
-                print(f"❌ Tool '{tool}' not found in sandbox")
-                print("🔄 Reinstalling security tools...")
+            # Check a sandbox out of the pool - concurrent commands get their own
+            sandbox = await self.acquire()
+            try:
+                self._stats[sandbox.sandbox_id]['commands'] += 1
+                self.command_count = int(self._stats[sandbox.sandbox_id]['commands'])
+                log.debug("[Sandbox] Running command #%d: %.80s...", self.command_count, command)
 
-                # Reinstall tools and retry once
-                await self.install_security_tools()
-                print(f"🔄 Retrying command: {command[:80]}...")
+                # Run command with timeout
                 result = await sandbox.commands.run(command, timeout=timeout)
 
-                if result.exit_code == 127:
-                    raise RuntimeError(
-                        f"Tool '{tool}' not available even after reinstall. "
-                        f"E2B sandbox may not support this tool."
-                    )
+                # Handle command not found errors (a reinstall only helps for known tools
+                # that weren't just installed; otherwise the 127 goes back to the caller)
+                tool = command.split()[0] if command.split() else ''
+                if result.exit_code == 127 and self._should_reinstall(sandbox, tool):
+                    log.error("❌ Tool '%s' not found in sandbox", tool)
+                    log.info("🔄 Reinstalling security tools...")
+
+                    # Reinstall tools and retry once
+                    await self.install_security_tools(sandbox)
+                    log.info("🔄 Retrying command: %.80s...", command)
+                    result = await sandbox.commands.run(command, timeout=timeout)
+
+                    if result.exit_code == 127:
+                        raise RuntimeError(
+                            f"Tool '{tool}' not available even after reinstall. "
+                            f"E2B sandbox may not support this tool."
+                        )
+            finally:
+                self.release(sandbox)
 
             # Log warnings for non-zero exits
             if result.exit_code != 0:
-                print(f"⚠️  Command exited with code {result.exit_code}")
+                log.warning("⚠️  Command exited with code %s", result.exit_code)
                 if result.stderr and len(result.stderr) < 500:
-                    print(f"  → Error: {result.stderr}")
+                    log.warning("  → Error: %s", result.stderr)
 
             return {
                 'stdout': result.stdout or '',
@@ -246,7 +598,7 @@ class SandboxManager:
 
         except asyncio.TimeoutError:
             error_msg = f"Command timed out after {timeout}s: {command[:80]}"
-            print(f"⏱️  {error_msg}")
+            log.warning("⏱️  %s", error_msg)
             return {
                 'stdout': '',
                 'stderr': f"Timeout: Command exceeded {timeout}s limit",
@@ -257,12 +609,12 @@ class SandboxManager:
 
         except Exception as e:
             error_msg = f"Command execution failed: {str(e)}"
-            print(f"❌ {error_msg}")
+            log.error("❌ %s", error_msg)
 
             # Check for quota/rate limit errors
             if "quota" in str(e).lower() or "rate" in str(e).lower():
-                print("💡 Hint: You may have hit E2B quota limits")
-                print("   Wait a few minutes or upgrade: https://e2b.dev/dashboard")
+                log.error("💡 Hint: You may have hit E2B quota limits")
+                log.error("   Wait a few minutes or upgrade: https://e2b.dev/dashboard")
 
             return {
                 'stdout': '',
@@ -272,32 +624,176 @@ class SandboxManager:
                 'output': error_msg
             }
 
+    async def stream_command(self, command: str, timeout: int = 120) -> AsyncIterator[str]:
+        """
+        Run a command in the sandbox, yielding its stdout chunks as they arrive
+
+        Long scans can be shown (or written out) incrementally. The SDK still
+        collects the whole output internally, so this doesn't save memory. stderr
+        is held back and yielded after stdout, after a newline, so the joined chunks
+        match run_command's output. Use run_command when the exit code is needed.
+
+        Args:
+            command: Shell command to execute
+            timeout: Command timeout in seconds
+
+        Yields:
+            stdout chunks in arrival order, then "\n" and any stderr
+
+        Raises:
+            Whatever the sandbox raised for the command (e.g. a timeout)
+        """
+        chunks: asyncio.Queue = asyncio.Queue()
+        stderr: List[str] = []
+        sandbox = await self.acquire()
+        try:
+            self._stats[sandbox.sandbox_id]['commands'] += 1
+            self.command_count = int(self._stats[sandbox.sandbox_id]['commands'])
+            log.debug("[Sandbox] Streaming command #%d: %.80s...", self.command_count, command)
+
+            run = asyncio.create_task(sandbox.commands.run(
+                command, timeout=timeout, on_stdout=chunks.put_nowait, on_stderr=stderr.append
+            ))
+            run.add_done_callback(lambda _: chunks.put_nowait(None))
+            try:
+                while (chunk := await chunks.get()) is not None:
+                    yield chunk
+                yield '\n' + ''.join(stderr)
+                # Surface a failed run; a non-zero exit just ends the stream
+                try:
+                    await run
+                except Exception as e:
+                    if getattr(e, 'exit_code', None) is None:
+                        raise
+            finally:
+                run.cancel()
+        finally:
+            self.release(sandbox)
+
+    async def run_commands(self, commands: List[str], timeout: int = 300) -> List[Dict[str, Any]]:
+        """
+        Run several commands in one sandbox round-trip
+
+        The commands run sequentially in a single shell script, and each one's
+        output is split back out by sentinel lines. Each command's stderr is
+        merged into its stdout.
+
+        Args:
+            commands: Shell commands to execute, in order
+            timeout: Timeout for the whole batch in seconds
+
+        Returns:
+            One run_command-style result dict per command, in input order
+        """
+        if not commands:
+            return []
+
+        marker = f"---AUTOCTF-{uuid.uuid4().hex[:8]}"
+        # Each command gets its own lines inside the subshell, so a trailing # comment
+        # or a heredoc in it can't swallow the closing parenthesis
+        script = "\n".join(
+            f'echo "{marker}-CMD{i}---"\n(\n{command}\n) 2>&1\necho "{marker}-RC{i}:$?---"'
+            for i, command in enumerate(commands)
+        )
+
+        try:
+            sandbox = await self.acquire()
+            try:
+                self._stats[sandbox.sandbox_id]['commands'] += 1
+                log.debug("[Sandbox] Running batch of %d commands...", len(commands))
+                result = await sandbox.commands.run(script, timeout=timeout)
+            finally:
+                self.release(sandbox)
+        except Exception as e:
+            error_msg = f"Batch execution failed: {str(e)}"
+            log.error("❌ %s", error_msg)
+            return [{
+                'stdout': '',
+                'stderr': error_msg,
+                'exit_code': -1,
+                'success': False,
+                'output': error_msg
+            } for _ in commands]
+
+        # Split the combined output back into per-command results
+        stdout = result.stdout or ''
+        results = []
+        for i in range(len(commands)):
+            match = re.search(
+                rf"{re.escape(marker)}-CMD{i}---\n(.*?){re.escape(marker)}-RC{i}:(\d+)---",
+                stdout,
+                re.DOTALL
+            )
+            if match:
+                output, exit_code = match.group(1), int(match.group(2))
+            else:
+                # Batch stopped before this command finished (e.g. timeout)
+                output, exit_code = '', -1
+            results.append({
+                'stdout': output,
+                'stderr': '',
+                'exit_code': exit_code,
+                'success': exit_code == 0,
+                'output': output
+            })
+        return results
+
     async def close_sandbox(self):
         """
-        Close and cleanup sandbox
+        Close and cleanup pooled sandboxes
         E2B sandboxes auto-cleanup on timeout, but manual cleanup is good practice
         """
-        if self.sandbox:
+        # No refills from here on - sandboxes still checked out are killed on release
+        self._closed = True
+        if self._loop is asyncio.get_running_loop():
+            for task in list(self._tasks):
+                task.cancel()
+        self._tasks.clear()
+
+        # Sandboxes reconnected from another run aren't ours to kill: hand them back unowned
+        pooled = []
+        while self._pool is not None and not self._pool.empty():
+            sandbox = self._pool.get_nowait()
+            if isinstance(sandbox, Exception):
+                continue
+            if sandbox.sandbox_id in self._created_ids:
+                pooled.append(sandbox)
+            elif sandbox.sandbox_id in self._stats:
+                self._released[sandbox.sandbox_id] = self._stats[sandbox.sandbox_id]['created_at']
+        self._released.update(self._saved)
+
+        # Forget stats first so checked-out sandboxes are discarded on release
+        self._stats.clear()
+        self._saved.clear()
+        self._save_ids()
+        self._live = len(self._in_use)
+        for sandbox in pooled:
+            self._created_ids.discard(sandbox.sandbox_id)
             try:
-                sandbox_id = self.sandbox.sandbox_id[:12]
-                print(f"🔒 Closing sandbox: {sandbox_id}...")
-                # Note: E2B handles cleanup automatically
-                self.sandbox = None
-                self.created_at = None
-                self.command_count = 0
-                print("✅ Sandbox closed")
+                log.info("🔒 Closing sandbox: %s...", sandbox.sandbox_id[:12])
+                await sandbox.kill()
             except Exception as e:
-                print(f"⚠️  Sandbox cleanup warning: {e}")
-                self.sandbox = None
+                log.warning("⚠️  Sandbox cleanup warning: %s", e)
+
+        self.sandbox = None
+        self.created_at = None
+        self.command_count = 0
+        log.info("✅ Sandbox pool closed")
 
     async def get_sandbox_info(self) -> Dict[str, Any]:
         """Get information about current sandbox state"""
+        pool = {
+            'pool_size': self.pool_size,
+            'ready': self._pool.qsize() if self._pool is not None else 0,
+            'in_use': len(self._in_use)
+        }
         if not self.sandbox:
             return {
                 'active': False,
                 'sandbox_id': None,
                 'age_seconds': 0,
-                'command_count': 0
+                'command_count': 0,
+                **pool
             }
 
         age = int(time.time() - self.created_at) if self.created_at else 0
@@ -308,7 +804,8 @@ class SandboxManager:
             'age_seconds': age,
             'command_count': self.command_count,
             'age_minutes': age / 60,
-            'will_reset_in': max(0, self.max_sandbox_age - age)
+            'will_reset_in': max(0, self.max_sandbox_age - age),
+            **pool
         }
 
 
@@ -337,6 +834,17 @@ async def run_in_sandbox(command: str, timeout: int = 120) -> str:
     result = await manager.run_command(command, timeout)
     return result['output']
 
+async def run_many_in_sandbox(commands: List[str], timeout: int = 300) -> List[str]:
+    """
+    Convenience function to run a batch of commands in one sandbox round-trip
+
+    Returns:
+        Output of each command, in input order
+    """
+    manager = await get_manager()
+    results = await manager.run_commands(commands, timeout)
+    return [result['output'] for result in results]
+
 async def cleanup():
     """Cleanup global sandbox manager"""
     global _manager
@@ -351,13 +859,7 @@ if __name__ == "__main__":
         print("Testing Sandbox Manager...")
         manager = SandboxManager()
 
-        # Create sandbox
-        await manager.create_sandbox()
-
-        # Install tools
-        await manager.install_security_tools()
-
-        # Run test command
+        # Run test command (boots the pool on first use)
         result = await manager.run_command("echo 'Hello from E2B!' && nmap --version | head -3")
         print(f"\nTest Result:\n{result['output']}")
 
@@ -369,4 +871,4 @@ if __name__ == "__main__":
         await manager.close_sandbox()
         print("\n✅ Test complete!")
 
-    asyncio.run(test())
+    run_coroutine(test())
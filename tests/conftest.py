@@ -0,0 +1,13 @@
+"""
+Shared pytest setup for the AutoCTF unit tests
+Nothing here talks to E2B, Browserbase or GitHub - the tests replace the network calls
+"""
+
+import os
+import sys
+
+# The modules under test live at the repository root (run from there: python -m pytest tests)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config.ENV is snapshotted on first import, and SandboxManager refuses to start without a key
+os.environ.setdefault("E2B_API_KEY", "test-key")
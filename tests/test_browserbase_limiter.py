@@ -0,0 +1,85 @@
+"""
+Tests for the Browserbase client-side rate limiting (token buckets, circuit breaker)
+"""
+
+import pytest
+
+from mcp import browserbase_client
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+class FakeSessions:
+    """Session API that fails every create with a 429 until `fail` is cleared"""
+
+    def __init__(self, fail=True):
+        self.fail = fail
+        self.creates = 0
+
+    def create(self, **kwargs):
+        self.creates += 1
+        if self.fail:
+            raise RateLimited("429 Too Many Requests")
+        return type("Session", (), {"id": f"sess-{self.creates}"})()
+
+    def retrieve(self, session_id):
+        raise RuntimeError("no such session")
+
+
+class FakeBrowserbase:
+    def __init__(self, fail=True):
+        self.sessions = FakeSessions(fail)
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch, tmp_path):
+    """Fresh per-project limits and a private session cache file for every test"""
+    monkeypatch.setattr(browserbase_client, "_limits", {})
+    monkeypatch.setattr(browserbase_client, "_CACHE_PATH", tmp_path / "bb_session.json")
+    monkeypatch.setattr(browserbase_client, "_created_ids", set())
+
+
+def test_token_bucket_allows_a_burst_then_throttles():
+    bucket = browserbase_client._TokenBucket(capacity=3, refill_per_sec=0.001)
+    assert [bucket.acquire(block=False) for _ in range(4)] == [True, True, True, False]
+
+
+def test_limits_are_per_project():
+    limits = browserbase_client._limits_for("project-a")
+    assert browserbase_client._limits_for("project-a") is limits
+    assert browserbase_client._limits_for("project-b") is not limits
+
+
+def test_breaker_opens_after_threshold_rate_limits():
+    breaker = browserbase_client._Breaker(threshold=3, cooldown=60)
+    assert not breaker.record_rate_limit()
+    breaker.record_success()  # a success resets the count
+    assert [breaker.record_rate_limit() for _ in range(3)] == [False, False, True]
+    assert breaker.is_open()
+
+
+def test_keep_alive_session_goes_through_the_breaker():
+    bb = FakeBrowserbase()
+    threshold = browserbase_client._limits_for("project-a").breaker.threshold
+    for _ in range(threshold):
+        with pytest.raises(RateLimited):
+            browserbase_client.keep_alive_session(bb, "project-a")
+
+    # Circuit open: no more creates are sent, and the error still classifies as a rate limit
+    with pytest.raises(browserbase_client.CircuitOpenError) as excinfo:
+        browserbase_client.keep_alive_session(bb, "project-a")
+    assert bb.sessions.creates == threshold
+    assert browserbase_client.classify_error(excinfo.value) == "rate_limit"
+
+    # Another project is unaffected
+    session, reused = browserbase_client.keep_alive_session(FakeBrowserbase(fail=False), "project-b")
+    assert session.id == "sess-1" and not reused
+
+
+def test_keep_alive_session_takes_a_token():
+    limits = browserbase_client._limits_for("project-a")
+    capacity = limits.session.capacity
+    browserbase_client.keep_alive_session(FakeBrowserbase(fail=False), "project-a")
+    assert sum(limits.session.acquire(block=False) for _ in range(capacity)) == capacity - 1
@@ -0,0 +1,97 @@
+"""
+Tests for the per-run DNS/whois lookup cache in mcp.exec_client
+"""
+
+import asyncio
+
+import pytest
+
+from mcp import exec_client
+
+
+@pytest.fixture
+def runs(monkeypatch):
+    """Replace the sandbox round trip; returns the list of commands actually executed"""
+    executed = []
+
+    async def fake_run_command(command, timeout=120, on_chunk=None):
+        executed.append(command)
+        await asyncio.sleep(0.01)  # let concurrent callers pile up on the same flight
+        if command.startswith("host fail"):
+            return "lookup failed", 1
+        if command.startswith("host boom"):
+            raise RuntimeError("sandbox went away")
+        return f"output of {command}", 0
+
+    monkeypatch.setattr(exec_client, "_run_command", fake_run_command)
+    return executed
+
+
+def test_lookups_are_shared_within_a_run(runs):
+    async def scenario():
+        with exec_client.run_cache():
+            results = await asyncio.gather(*(exec_client.exec_command("whois example.com") for _ in range(3)))
+            again = await exec_client.exec_command("whois example.com")
+        return results, again
+
+    results, again = asyncio.run(scenario())
+    assert results == ["output of whois example.com"] * 3
+    assert again == "output of whois example.com"
+    assert runs == ["whois example.com"]
+
+
+def test_live_probes_are_never_cached(runs):
+    async def scenario():
+        with exec_client.run_cache():
+            await exec_client.exec_command("nmap -Pn 10.0.0.1")
+            await exec_client.exec_command("nmap -Pn 10.0.0.1")
+
+    asyncio.run(scenario())
+    assert runs == ["nmap -Pn 10.0.0.1"] * 2
+
+
+def test_no_caching_outside_a_run(runs):
+    async def scenario():
+        await exec_client.exec_command("dig example.com")
+        await exec_client.exec_command("dig example.com")
+
+    asyncio.run(scenario())
+    assert runs == ["dig example.com"] * 2
+
+
+def test_runs_do_not_share_results(runs):
+    async def scenario():
+        for _ in range(2):
+            with exec_client.run_cache():
+                await exec_client.exec_command("nslookup example.com")
+
+    asyncio.run(scenario())
+    assert runs == ["nslookup example.com"] * 2
+
+
+def test_failed_lookups_are_retried(runs):
+    async def scenario():
+        with exec_client.run_cache():
+            await exec_client.exec_command("host fail.example")
+            await exec_client.exec_command("host fail.example")
+            for _ in range(2):
+                with pytest.raises(RuntimeError):
+                    await exec_client.exec_command("host boom.example")
+
+    asyncio.run(scenario())
+    assert runs == ["host fail.example"] * 2 + ["host boom.example"] * 2
+
+
+def test_callers_sharing_a_lookup_get_its_output_as_one_chunk(runs):
+    second = []
+
+    async def scenario():
+        with exec_client.run_cache():
+            await asyncio.gather(
+                exec_client.exec_command("whois example.com"),
+                exec_client.exec_command("whois example.com", on_chunk=second.append),
+            )
+
+    asyncio.run(scenario())
+    assert runs == ["whois example.com"]
+    assert second == ["output of whois example.com"]
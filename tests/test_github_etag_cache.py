@@ -0,0 +1,81 @@
+"""
+Tests for the GitHub client's ETag cache (conditional GETs, LRU cap, owner-only file)
+"""
+
+import os
+import stat
+
+import pytest
+
+from mcp import github_client
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, etag=None):
+        self.status_code = status_code
+        self._body = body
+        self.content = b"{}" if body is not None else b""
+        self.headers = {"ETag": etag} if etag else {}
+
+    def json(self):
+        return self._body
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    """A GitHubClient with no network: _request answers from `client.responses` and records calls"""
+    monkeypatch.setattr(github_client, "_ETAG_CACHE_PATH", tmp_path / "github_etags.json")
+    client = github_client.GitHubClient.__new__(github_client.GitHubClient)
+    client._etag_cache = {}
+    client.requests = []
+    client.responses = []
+
+    def fake_request(method, url, headers=None, **kwargs):
+        client.requests.append((url, dict(headers or {})))
+        return client.responses.pop(0)
+
+    client._request = fake_request
+    return client
+
+
+def test_not_modified_returns_the_cached_body(client):
+    client.responses = [FakeResponse(200, {"sha": "abc"}, etag='"v1"'), FakeResponse(304)]
+
+    assert client._rest_get("/repos/o/r/contents/app.py") == (200, {"sha": "abc"})
+    assert client._rest_get("/repos/o/r/contents/app.py") == (200, {"sha": "abc"})
+
+    (_, first_headers), (_, second_headers) = client.requests
+    assert "If-None-Match" not in first_headers
+    assert second_headers["If-None-Match"] == '"v1"'
+
+
+def test_responses_without_etag_are_not_cached(client):
+    client.responses = [FakeResponse(200, {"sha": "abc"}), FakeResponse(404, {"message": "Not Found"}, etag='"x"')]
+
+    client._rest_get("/a")
+    client._rest_get("/b")
+    assert client._etag_cache == {}
+
+
+def test_cache_drops_least_recently_used_entries(client, monkeypatch):
+    monkeypatch.setattr(github_client, "ETAG_CACHE_MAX_ENTRIES", 2)
+    client.responses = [
+        FakeResponse(200, {"n": 1}, etag='"1"'),
+        FakeResponse(200, {"n": 2}, etag='"2"'),
+        FakeResponse(304),  # touching /one makes /two the oldest
+        FakeResponse(200, {"n": 3}, etag='"3"'),
+    ]
+    for path in ("/one", "/two", "/one", "/three"):
+        client._rest_get(path)
+
+    assert [url.rsplit("/", 1)[1] for url in client._etag_cache] == ["one", "three"]
+
+
+def test_saved_cache_is_owner_only_and_reloads(client):
+    client.responses = [FakeResponse(200, {"sha": "abc"}, etag='"v1"')]
+    client._rest_get("/private")
+    client._save_etag_cache()
+
+    mode = stat.S_IMODE(os.stat(github_client._ETAG_CACHE_PATH).st_mode)
+    assert mode == 0o600
+    assert github_client.GitHubClient._load_etag_cache() == client._etag_cache
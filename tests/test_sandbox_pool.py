@@ -0,0 +1,143 @@
+"""
+Tests for the SandboxManager warm pool (sharing, recycling, loop rebinding, saved IDs)
+"""
+
+import asyncio
+import itertools
+import json
+import os
+
+import pytest
+
+import sandbox_manager
+
+
+class FakeSandbox:
+    """Stands in for e2b.AsyncSandbox; records every create, connect and kill"""
+
+    _ids = itertools.count()
+    created = []
+    connected = []
+    killed = []
+
+    def __init__(self, sandbox_id=None):
+        self.sandbox_id = sandbox_id or f"sbx-{next(self._ids)}"
+
+    @classmethod
+    async def create(cls, **kwargs):
+        sandbox = cls()
+        cls.created.append(sandbox.sandbox_id)
+        return sandbox
+
+    @classmethod
+    async def connect(cls, sandbox_id, **kwargs):
+        cls.connected.append(sandbox_id)
+        return cls(sandbox_id)
+
+    async def set_timeout(self, timeout):
+        pass
+
+    async def kill(self):
+        self.killed.append(self.sandbox_id)
+
+
+@pytest.fixture
+def manager(monkeypatch, tmp_path):
+    """A SandboxManager on fake sandboxes, with its saved-ID file under tmp_path"""
+    for name in ("created", "connected", "killed"):
+        monkeypatch.setattr(FakeSandbox, name, [])
+    monkeypatch.setattr(sandbox_manager, "AsyncSandbox", FakeSandbox)
+    monkeypatch.setattr(sandbox_manager, "_SANDBOX_CACHE_PATH", tmp_path / "sandboxes.json")
+
+    async def no_install(self, sandbox=None):
+        pass
+
+    monkeypatch.setattr(sandbox_manager.SandboxManager, "install_security_tools", no_install)
+    return sandbox_manager.SandboxManager()
+
+
+def test_concurrent_callers_share_one_sandbox(manager):
+    async def scenario():
+        sandboxes = await asyncio.gather(*(manager.acquire() for _ in range(4)))
+        assert manager._in_use == {sandboxes[0]: 4}
+        for sandbox in sandboxes:
+            manager.release(sandbox)
+        return sandboxes
+
+    sandboxes = asyncio.run(scenario())
+    assert len({s.sandbox_id for s in sandboxes}) == 1
+    assert FakeSandbox.created == [sandboxes[0].sandbox_id]
+    assert manager._in_use == {}
+    assert manager._pool.qsize() == 1
+
+
+def test_expired_sandbox_is_recycled(manager):
+    async def scenario():
+        first = await manager.acquire()
+        manager._stats[first.sandbox_id]['commands'] = manager.max_commands
+        manager.release(first)
+        await asyncio.sleep(0)  # let the background kill and refill run
+        second = await manager.acquire()
+        manager.release(second)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first.sandbox_id != second.sandbox_id
+    assert FakeSandbox.killed == [first.sandbox_id]
+
+
+def test_new_event_loop_reconnects_by_id(manager):
+    async def use_once():
+        sandbox = await manager.acquire()
+        manager.release(sandbox)
+        return sandbox.sandbox_id
+
+    first_id = asyncio.run(use_once())
+    second_id = asyncio.run(use_once())
+    assert second_id == first_id
+    assert FakeSandbox.created == [first_id]
+    assert FakeSandbox.connected == [first_id]
+
+
+def test_saved_ids_are_owned_per_process(manager):
+    path = sandbox_manager._SANDBOX_CACHE_PATH
+
+    async def scenario():
+        sandbox = await manager.acquire()
+        manager.release(sandbox)
+        return sandbox.sandbox_id
+
+    sandbox_id = asyncio.run(scenario())
+    entries = json.loads(path.read_text())
+    assert entries[sandbox_id]['pid'] == os.getpid()
+
+    # A second manager in this (live) process must not claim the first one's sandbox
+    assert sandbox_manager.SandboxManager()._saved == {}
+
+    # Another process's entries survive this manager's saves
+    entries["sbx-other"] = {'created_at': entries[sandbox_id]['created_at'], 'host': 'elsewhere', 'pid': 1}
+    path.write_text(json.dumps(entries))
+    manager._save_ids()
+    assert "sbx-other" in json.loads(path.read_text())
+
+
+def test_close_kills_only_sandboxes_it_created(manager):
+    # An orphaned entry, released by an earlier run (pid None)
+    now = sandbox_manager.time.time()
+    orphan = {"sbx-orphan": {'created_at': now, 'host': sandbox_manager._HOST, 'pid': None}}
+    sandbox_manager._SANDBOX_CACHE_PATH.write_text(json.dumps(orphan))
+    manager = sandbox_manager.SandboxManager()  # claims the orphan
+    manager.pool_size = 2
+
+    async def scenario():
+        manager.release(await manager.acquire())
+        while manager._pool.qsize() < 2:  # both the reconnect and the new sandbox are pooled
+            await asyncio.sleep(0)
+        await manager.close_sandbox()
+
+    asyncio.run(scenario())
+    assert FakeSandbox.connected == ["sbx-orphan"]
+    assert len(FakeSandbox.created) == 1
+    assert FakeSandbox.killed == FakeSandbox.created
+    # The reconnected sandbox is handed back unowned for the next run
+    assert json.loads(sandbox_manager._SANDBOX_CACHE_PATH.read_text()) == orphan
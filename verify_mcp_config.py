@@ -4,144 +4,327 @@ MCP Configuration Diagnostic Script
 Verifies that all "MCP" clients and environment variables are properly configured
 """
 
+import argparse
+import importlib
+import importlib.util
 import os
 import sys
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
 
-# Load environment variables
-load_dotenv()
+# Heavier imports (dotenv, e2b, asyncio) happen inside the functions that need them
+
+# (section, [(env var, required)]) - the environment variables checked, in report order
+ENV_CHECKS = [
+    ("Required for E2B Sandbox (Exec Client)", [("E2B_API_KEY", True)]),
+    ("Required for Browserbase (Screenshot Client)", [("BROWSERBASE_API_KEY", True), ("BROWSERBASE_PROJECT_ID", True)]),
+    ("Required for GitHub (PR Creation)", [("GITHUB_TOKEN", True), ("GITHUB_REPO", True)]),
+    ("Required for LLM Analysis", [("XAI_API_KEY", True)]),
+    ("Required for Dashboard Database", [("DATABASE_URL", True)]),
+    ("Optional", [("OPENAI_API_KEY", False)]),
+]
+
+# (module, display name) of the MCP clients and agent modules checked
+MCP_MODULES = [
+    ("mcp.exec_client", "E2B Exec Client"),
+    ("mcp.browserbase_client", "Browserbase Client"),
+    ("mcp.github_client", "GitHub Client"),
+]
+AGENT_MODULES = [
+    ("agent.recon", "Recon Module"),
+    ("agent.analyze", "Analyze Module"),
+    ("agent.exploit", "Exploit Module"),
+]
+
+# Seconds to wait for the test sandbox to boot before reporting E2B as unreachable
+SANDBOX_CREATE_TIMEOUT = 10
+
+# E2B-side lifetime of the test sandbox, so one that can't be killed (see below) is reclaimed soon
+SANDBOX_LIFETIME = 30
+
+# Extra seconds to wait, after the report, for a create that timed out - it may still boot
+# server-side, and is killed if it does
+LATE_SANDBOX_GRACE = 10
+
+# Sandbox creates abandoned after SANDBOX_CREATE_TIMEOUT (set by create_sandbox)
+_late_creates = set()
+
+# Environment snapshot read by check_env_var (set by load_env)
+ENV = {}
+
+# Static report header
+BANNER = """
+╔════════════════════════════════════════════════════════════╗
+║        AutoCTF MCP Configuration Diagnostic                ║
+╚════════════════════════════════════════════════════════════╝
+
+
+📋 IMPORTANT NOTE:
+============================================================
+The 'mcp/' directory contains Python helper modules, NOT
+actual Model Context Protocol (MCP) servers. These are
+simple wrapper functions around APIs (E2B, Browserbase, GitHub).
+No MCP server/client protocol is being used.
+============================================================
+"""
+
+# Machine-readable check results, written instead of the report with --json
+results = {"env": {}, "modules": {}, "e2b": None}
+
+# Report lines, written out in one go by flush() instead of one print per line
+out = []
+
+def flush():
+    """Write the buffered report lines to stdout"""
+    if out:
+        sys.stdout.write("\n".join(out) + "\n")
+        sys.stdout.flush()
+        out.clear()
+
+def report(result):
+    """Buffer a check's report line and return whether it passed"""
+    ok, line = result
+    out.append(line)
+    return ok
+
+def load_env():
+    """
+    Load .env once and snapshot the environment into ENV
+
+    When the environment already provides every checked variable, optional ones
+    included (e.g. injected by the container or systemd), .env is not read at all;
+    otherwise an optional variable that only lives in .env would be reported missing.
+    """
+    global ENV
+    checked = [var for _, variables in ENV_CHECKS for var, _ in variables]
+    if all(var in os.environ for var in checked):
+        ENV = dict(os.environ)
+        return
+    import config
+    ENV = config.ENV
+
+def mask(value):
+    """Shorten a secret to its first 10 characters for display"""
+    n = len(value) if value else 0
+    return value[:10] + "..." if n > 10 else (value if n else "NOT SET")
 
 def check_env_var(var_name, required=True):
-    """Check if an environment variable is set"""
-    value = os.getenv(var_name)
+    """Check if an environment variable is set; returns (ok, report line)"""
+    value = ENV.get(var_name)
     status = "✅" if value else "❌"
-    masked_value = f"{value[:10]}..." if value and len(value) > 10 else value or "NOT SET"
 
-    print(f"  {status} {var_name}: {masked_value}")
+    return not (required and not value), f"  {status} {var_name}: {mask(value)}"
 
-    if required and not value:
-        return False
-    return True
+def check_module_import(module_name, display_name, deep=False):
+    """
+    Check if a module can be imported; returns (ok, report line)
 
-def check_module_import(module_name, display_name):
-    """Check if a module can be imported"""
+    Only locates the module ("Found" - its dependencies are not checked) unless deep
+    is set, in which case it is actually imported ("Importable").
+    """
     try:
-        __import__(module_name)
-        print(f"  ✅ {display_name}: Importable")
-        return True
+        if deep:
+            __import__(module_name)
+            return True, f"  ✅ {display_name}: Importable"
+        if importlib.util.find_spec(module_name) is None:
+            raise ImportError(f"No module named '{module_name}'")
+        return True, f"  ✅ {display_name}: Found"
     except Exception as e:
-        print(f"  ❌ {display_name}: Import failed - {e}")
-        return False
+        return False, f"  ❌ {display_name}: Import failed - {e}"
 
-print("""
-╔════════════════════════════════════════════════════════════╗
-║        AutoCTF MCP Configuration Diagnostic                ║
-╚════════════════════════════════════════════════════════════╝
-""")
-
-print("\n📋 IMPORTANT NOTE:")
-print("=" * 60)
-print("The 'mcp/' directory contains Python helper modules, NOT")
-print("actual Model Context Protocol (MCP) servers. These are")
-print("simple wrapper functions around APIs (E2B, Browserbase, GitHub).")
-print("No MCP server/client protocol is being used.")
-print("=" * 60)
-
-# Check environment variables
-print("\n🔐 ENVIRONMENT VARIABLES:")
-print("-" * 60)
-all_vars_ok = True
-
-print("\n  Required for E2B Sandbox (Exec Client):")
-all_vars_ok &= check_env_var("E2B_API_KEY", required=True)
-
-print("\n  Required for Browserbase (Screenshot Client):")
-all_vars_ok &= check_env_var("BROWSERBASE_API_KEY", required=True)
-all_vars_ok &= check_env_var("BROWSERBASE_PROJECT_ID", required=True)
-
-print("\n  Required for GitHub (PR Creation):")
-all_vars_ok &= check_env_var("GITHUB_TOKEN", required=True)
-all_vars_ok &= check_env_var("GITHUB_REPO", required=True)
-
-print("\n  Required for LLM Analysis:")
-all_vars_ok &= check_env_var("XAI_API_KEY", required=True)
-
-print("\n  Required for Dashboard Database:")
-all_vars_ok &= check_env_var("DATABASE_URL", required=True)
-
-print("\n  Optional:")
-check_env_var("OPENAI_API_KEY", required=False)
-
-# Check MCP client modules
-print("\n\n📦 MCP CLIENT MODULES (Python Helpers):")
-print("-" * 60)
-all_modules_ok = True
-
-all_modules_ok &= check_module_import("mcp.exec_client", "E2B Exec Client")
-all_modules_ok &= check_module_import("mcp.browserbase_client", "Browserbase Client")
-all_modules_ok &= check_module_import("mcp.github_client", "GitHub Client")
-
-# Check agent modules
-print("\n\n🤖 AGENT MODULES:")
-print("-" * 60)
-all_modules_ok &= check_module_import("agent.recon", "Recon Module")
-all_modules_ok &= check_module_import("agent.analyze", "Analyze Module")
-all_modules_ok &= check_module_import("agent.exploit", "Exploit Module")
-
-# Test E2B connection
-print("\n\n🔌 E2B SANDBOX CONNECTION TEST:")
-print("-" * 60)
-try:
-    from e2b import AsyncSandbox
+def import_parent_packages(modules):
+    """
+    Import the parent packages of `modules` once, up front
+
+    find_spec imports a module's parent package; doing it here means the concurrent
+    probes all find it in sys.modules instead of contending on its import lock.
+    (mcp/ and agent/ have no package init code, so this runs nothing.)
+    """
+    for package in dict.fromkeys(module.rpartition(".")[0] for module, _ in modules):
+        if package:
+            try:
+                importlib.import_module(package)
+            except ImportError:
+                pass  # reported by the per-module probes
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Verify AutoCTF MCP client configuration")
+    parser.add_argument("--deep", action="store_true",
+                        help="fully import each module and run a command in the E2B sandbox")
+    parser.add_argument("--force", action="store_true",
+                        help="run every check even when required environment variables are missing")
+    parser.add_argument("--json", action="store_true",
+                        help="print the results as a single JSON object instead of the report")
+    return parser.parse_args()
+
+async def create_sandbox():
+    """Create the E2B sandbox used by the connection test, giving up after SANDBOX_CREATE_TIMEOUT"""
     import asyncio
+    from e2b import AsyncSandbox
+    create = asyncio.ensure_future(AsyncSandbox.create(timeout=SANDBOX_LIFETIME))
+    try:
+        # Shielded: cancelling the request wouldn't stop a boot E2B already started
+        return await asyncio.wait_for(asyncio.shield(create), SANDBOX_CREATE_TIMEOUT)
+    except asyncio.TimeoutError:
+        _late_creates.add(create)
+        raise
 
-    async def test_e2b():
+async def kill_sandboxes(sandbox):
+    """Kill the test sandbox, and any late one whose create finishes within LATE_SANDBOX_GRACE"""
+    import asyncio
+    sandboxes = [sandbox] if sandbox is not None else []
+    if _late_creates:
+        done, still_pending = await asyncio.wait(_late_creates, timeout=LATE_SANDBOX_GRACE)
+        sandboxes += [c.result() for c in done if not c.cancelled() and c.exception() is None]
+        for create in still_pending:
+            create.cancel()  # expires after SANDBOX_LIFETIME if it boots anyway
+        _late_creates.clear()
+    for sb in sandboxes:
         try:
-            sandbox = await AsyncSandbox.create(timeout=30)
-            print("  ✅ E2B sandbox created successfully")
-
-            # Test command execution
-            result = await sandbox.commands.run("echo 'AutoCTF Test'")
-            if "AutoCTF Test" in result.stdout:
-                print("  ✅ Command execution verified")
-
-            # E2B sandboxes auto-cleanup on timeout, no need to manually close
-            print("  ✅ E2B connection fully operational")
-            return True
-        except Exception as e:
-            print(f"  ❌ E2B connection failed: {e}")
-            return False
-
-    e2b_ok = asyncio.run(test_e2b())
-except Exception as e:
-    print(f"  ❌ E2B test failed: {e}")
-    e2b_ok = False
-
-# Summary
-print("\n\n" + "=" * 60)
-print("📊 DIAGNOSTIC SUMMARY")
-print("=" * 60)
-
-if all_vars_ok and all_modules_ok and e2b_ok:
-    print("✅ ALL CHECKS PASSED - AutoCTF is properly configured")
-    print("\nYou can now:")
-    print("  1. Start the dashboard: ./start-dashboard.sh")
-    print("  2. Add a target via the UI")
-    print("  3. Run a pentest scan")
-    sys.exit(0)
-else:
-    print("❌ CONFIGURATION ISSUES DETECTED")
-    print("\nIssues found:")
+            await sb.kill()
+        except Exception:
+            pass  # expires after SANDBOX_LIFETIME
+
+async def test_e2b_connect(pending):
+    """Wait for the sandbox being created by `pending`; returns it, or None if E2B is unreachable"""
+    try:
+        sandbox = await pending
+        out.append("  ✅ E2B sandbox created successfully")
+        return sandbox
+    except Exception as e:
+        out.append(f"  ❌ E2B connection failed: {e}")
+        return None
+
+async def test_e2b_exec(sandbox):
+    """Run a command in the sandbox (one more round-trip, only with --deep)"""
+    try:
+        result = await sandbox.commands.run("echo 'AutoCTF Test'")
+        if "AutoCTF Test" in result.stdout:
+            out.append("  ✅ Command execution verified")
+        return True
+    except Exception as e:
+        out.append(f"  ❌ E2B command execution failed: {e}")
+        return False
+
+def summarize(all_vars_ok, all_modules_ok=True, e2b_ok=True, as_json=False) -> int:
+    """Buffer the diagnostic summary and flush the report (or write `results` as JSON); returns the exit code"""
+    if as_json:
+        import json
+        results["ok"] = bool(all_vars_ok and all_modules_ok and e2b_ok)
+        sys.stdout.write(json.dumps(results) + "\n")
+        return 0 if results["ok"] else 1
+
+    out.append("\n\n" + "=" * 60)
+    out.append("📊 DIAGNOSTIC SUMMARY")
+    out.append("=" * 60)
+
+    if all_vars_ok and all_modules_ok and e2b_ok:
+        out.append("✅ ALL CHECKS PASSED - AutoCTF is properly configured")
+        out.append("\nYou can now:")
+        out.append("  1. Start the dashboard: ./start-dashboard.sh")
+        out.append("  2. Add a target via the UI")
+        out.append("  3. Run a pentest scan")
+        flush()
+        return 0
+
+    out.append("❌ CONFIGURATION ISSUES DETECTED")
+    out.append("\nIssues found:")
     if not all_vars_ok:
-        print("  • Missing or invalid environment variables")
-        print("    → Check your .env file in the project root")
+        out.append("  • Missing or invalid environment variables")
+        out.append("    → Check your .env file in the project root")
     if not all_modules_ok:
-        print("  • Module import failures")
-        print("    → Run: pip install -r requirements.txt")
+        out.append("  • Module import failures")
+        out.append("    → Run: pip install -r requirements.txt")
     if not e2b_ok:
-        print("  • E2B sandbox connection failed")
-        print("    → Verify E2B_API_KEY is valid")
-        print("    → Check internet connectivity")
+        out.append("  • E2B sandbox connection failed")
+        out.append("    → Verify E2B_API_KEY is valid")
+        out.append("    → Check internet connectivity")
+
+    out.append("\nFix these issues before running AutoCTF.")
+    flush()
+    return 1
+
+
+async def main(args) -> int:
+    """Run all checks and print the report; returns the exit code"""
+    import asyncio
 
-    print("\nFix these issues before running AutoCTF.")
-    sys.exit(1)
+    if not args.json:
+        sys.stdout.write(BANNER)
+
+    # Check environment variables
+    load_env()
+    out.append("\n🔐 ENVIRONMENT VARIABLES:")
+    out.append("-" * 60)
+    all_vars_ok = True
+
+    for section, variables in ENV_CHECKS:
+        out.append(f"\n  {section}:")
+        for var_name, required in variables:
+            all_vars_ok &= report(check_env_var(var_name, required))
+            results["env"][var_name] = bool(ENV.get(var_name))
+
+    # Missing config makes the remaining checks (and a sandbox boot) pointless
+    if not all_vars_ok and not args.force:
+        out.append("\n⏭️  Skipping module and E2B checks until the environment is fixed (--force runs them anyway)")
+        return summarize(all_vars_ok, as_json=args.json)
+
+    # Start booting the test sandbox now; it comes up while the module checks run
+    sandbox_task = asyncio.create_task(create_sandbox())
+
+    # Check MCP client and agent modules - probed concurrently, reported in order
+    modules = MCP_MODULES + AGENT_MODULES
+    import_parent_packages(modules)
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=len(modules)) as pool:
+        module_results = await asyncio.gather(*(
+            loop.run_in_executor(pool, check_module_import, module, display, args.deep)
+            for module, display in modules
+        ))
+    results["modules"] = {module: ok for (module, _), (ok, _) in zip(modules, module_results)}
+
+    out.append("\n\n📦 MCP CLIENT MODULES (Python Helpers):")
+    out.append("-" * 60)
+    all_modules_ok = True
+    for result in module_results[:len(MCP_MODULES)]:
+        all_modules_ok &= report(result)
+
+    out.append("\n\n🤖 AGENT MODULES:")
+    out.append("-" * 60)
+    for result in module_results[len(MCP_MODULES):]:
+        all_modules_ok &= report(result)
+    if not args.deep:
+        out.append("\n  ℹ️  Modules were only located, not imported - run with --deep to check their dependencies")
+
+    # Test E2B connection
+    out.append("\n\n🔌 E2B SANDBOX CONNECTION TEST:")
+    out.append("-" * 60)
+    if not args.json:
+        flush()  # show progress before waiting on the (slow) network test
+    sandbox = await test_e2b_connect(sandbox_task)
+    try:
+        e2b_ok = sandbox is not None
+        if e2b_ok and args.deep:
+            e2b_ok = await test_e2b_exec(sandbox)
+        if e2b_ok:
+            out.append("  ✅ E2B connection fully operational" if args.deep else "  ✅ E2B connection operational")
+
+        results["e2b"] = e2b_ok
+
+        return summarize(all_vars_ok, all_modules_ok, e2b_ok, as_json=args.json)
+    finally:
+        # After the report, so killing (or waiting out a late boot) doesn't delay it
+        await kill_sandboxes(sandbox)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    # A bare loop is enough for one coroutine (no default executor to start or shut down)
+    import asyncio
+    loop = asyncio.new_event_loop()
+    try:
+        exit_code = loop.run_until_complete(main(args))
+    finally:
+        loop.close()
+    sys.exit(exit_code)